@@ -1,9 +1,28 @@
 from django.contrib import admin
-from .models import StudentMarks
+from .models import CurrentStudentMarks, GradeSubmissionJob, StudentMarks
 
 @admin.register(StudentMarks)
 class StudentMarksAdmin(admin.ModelAdmin):
     list_display = ('student_id', 'total_marks', 'submission_date')
     list_filter = ('submission_date',)
-    search_fields = ('student_id',)
+    search_fields = ('=student__id', 'student__first_name', 'student__last_name')
     date_hierarchy = 'submission_date'
+
+
+
+@admin.register(GradeSubmissionJob)
+class GradeSubmissionJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'total_rows', 'processed_rows', 'created_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+    readonly_fields = ('result', 'error', 'started_at', 'finished_at')
+
+
+
+@admin.register(CurrentStudentMarks)
+class CurrentStudentMarksAdmin(admin.ModelAdmin):
+    list_display = ('student_id', 'total_marks', 'submission_date')
+    search_fields = ('=student__id', 'student__first_name', 'student__last_name')
+
+    def has_change_permission(self, request, obj=None):
+        # Rows are derived from StudentMarks; rebuild them with rebuild_current_marks
+        return False
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class GradingSystemConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'grading_system'
+
+
+    def ready(self):
+        # Connect the cache invalidation receivers
+        from . import signals  # noqa: F401
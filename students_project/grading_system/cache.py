@@ -0,0 +1,157 @@
+# grading_system/cache.py
+"""
+Versioned response cache for the marks and student read endpoints.
+
+Each cached response is keyed by the version counters of the data it depends on:
+the whole marks table, the student list, a single class or a single student.
+Writes bump the affected counters, so stale entries are never served again and
+simply age out of the cache backend.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.views.decorators.http import condition
+
+# Version scopes
+MARKS = ('marks', '')
+STUDENTS = ('students', '')
+
+
+def class_scope(class_name):
+    """Version scope covering every student and mark in a class"""
+    return ('class', str(class_name))
+
+
+def student_scope(student_id):
+    """Version scope covering one student and their marks"""
+    return ('student', str(student_id))
+
+
+def get_cache():
+    return caches[getattr(settings, 'MARKS_CACHE_ALIAS', 'default')]
+
+
+def _hashed(*parts):
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def _version_key(scope):
+    # Class names may contain spaces, which some backends reject in keys
+    return f"marks-cache:version:{_hashed(*scope)}"
+
+
+def get_versions(scopes):
+    """
+    Return the current version of each scope, initializing any that are missing.
+
+    Versions are nanosecond timestamps of the last write, so a counter lost to eviction
+    or a restart is re-created with a value that was never used before.
+    """
+    cache = get_cache()
+    keys = [_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _bump(keys):
+    version = time.time_ns()
+    get_cache().set_many({key: version for key in keys}, timeout=None)
+
+
+def bump_versions(scopes):
+    """
+    Invalidate every cached response that depends on any of the given scopes.
+
+    The bump happens immediately and again once the current transaction commits, so a
+    reader cannot re-cache data that was read before the write became visible.
+    """
+    keys = {_version_key(scope) for scope in scopes}
+    if not keys:
+        return
+    _bump(keys)
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def invalidate_marks(student_ids, class_names):
+    """Bump the versions affected by marks written for the given students"""
+    bump_versions(
+        [MARKS]
+        + [student_scope(student_id) for student_id in student_ids]
+        + [class_scope(class_name) for class_name in class_names]
+    )
+
+
+def versioned_cache(scopes):
+    """
+    Cache successful GET responses of a view under the versions of its data.
+
+    scopes is a callable taking the request and returning the version scopes the
+    response depends on; an empty list means the request is invalid and is not cached.
+    The query string and Accept header are part of the key, and streaming responses
+    are passed through uncached.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+
+            request_scopes = scopes(request)
+            if not request_scopes:
+                return view_func(request, *args, **kwargs)
+
+            cache = get_cache()
+            versions = get_versions(request_scopes)
+            key = 'marks-cache:response:{}:{}'.format(view_func.__name__, _hashed(
+                versions, args, sorted(kwargs.items()), sorted(request.GET.lists()),
+                request.META.get('HTTP_ACCEPT', ''),
+            ))
+
+            cached = cache.get(key)
+            if cached is not None:
+                content, status, headers = cached
+                response = HttpResponse(content, status=status)
+                for header, value in headers:
+                    response[header] = value
+                return response
+
+            response = view_func(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                if hasattr(response, 'render') and not response.is_rendered:
+                    # DRF responses are rendered lazily
+                    response.render()
+                cache.set(key, (response.content, response.status_code, list(response.items())),
+                          timeout=getattr(settings, 'MARKS_CACHE_TIMEOUT', 3600))
+            return response
+        return wrapper
+    return decorator
+
+
+def versioned_condition(scopes):
+    """
+    Answer conditional GETs from the version counters alone.
+
+    The ETag hashes the scope versions with the query string and Accept header, so a
+    client holding a current copy gets a 304 without the view or the database being
+    touched. No Last-Modified is sent: HTTP dates have one-second resolution, and a
+    client revalidating with If-Modified-Since alone would miss writes made in the
+    same second it fetched.
+    """
+    def etag(request, *args, **kwargs):
+        request_scopes = scopes(request)
+        if not request_scopes:
+            # Invalid requests have no data to version and are never answered with a 304
+            return None
+        return _hashed(get_versions(request_scopes), args, sorted(kwargs.items()),
+                       sorted(request.GET.lists()), request.META.get('HTTP_ACCEPT', ''))
+
+    return condition(etag_func=etag)
@@ -0,0 +1,32 @@
+# grading_system/management/commands/process_grade_jobs.py
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from grading_system.utils import claim_next_grade_job, process_grade_job
+
+
+class Command(BaseCommand):
+    help = 'Process queued grade submissions created by submit_grades in async mode'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the queue and exit instead of polling for new jobs')
+        parser.add_argument('--sleep', type=float, default=5.0,
+                            help='Seconds to wait between polls when the queue is empty')
+        parser.add_argument('--chunk-size', type=int,
+                            default=getattr(settings, 'GRADES_INGEST_CHUNK_SIZE', 500),
+                            help='Rows validated and committed per chunk')
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_next_grade_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['sleep'])
+                continue
+
+            job = process_grade_job(job, options['chunk_size'])
+            self.stdout.write(f"Job #{job.id} {job.status}: {job.processed_rows}/{job.total_rows} rows")
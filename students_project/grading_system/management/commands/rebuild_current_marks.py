@@ -0,0 +1,20 @@
+# grading_system/management/commands/rebuild_current_marks.py
+from django.core.management.base import BaseCommand
+
+from grading_system.cache import invalidate_marks
+from grading_system.utils import refresh_current_marks
+from students_app.models import Student
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the current (latest) marks table from the full StudentMarks history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('student_ids', nargs='*', type=int,
+                            help='Only rebuild these students (default: every student)')
+
+    def handle(self, *args, **options):
+        count = refresh_current_marks(options['student_ids'] or None)
+        # Statistics are served from the current marks table, so drop any cached copies
+        invalidate_marks([], set(Student.objects.values_list('class_name', flat=True)))
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt current marks for {count} students"))
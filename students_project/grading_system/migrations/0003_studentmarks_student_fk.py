@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-18 08:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grading_system', '0002_gradesubmissionjob'),
+        ('students_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='studentmarks',
+            old_name='student_id',
+            new_name='student',
+        ),
+        migrations.AlterField(
+            model_name='studentmarks',
+            name='student',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='marks', to='students_app.student'),
+        ),
+        migrations.AddIndex(
+            model_name='studentmarks',
+            index=models.Index(fields=['student', '-submission_date'], name='marks_student_latest_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2 on 2026-10-18 08:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_current_marks(apps, schema_editor):
+    Student = apps.get_model('students_app', 'Student')
+    StudentMarks = apps.get_model('grading_system', 'StudentMarks')
+    CurrentStudentMarks = apps.get_model('grading_system', 'CurrentStudentMarks')
+
+    latest_marks = {}
+    marks = StudentMarks.objects.filter(student_id__in=Student.objects.values('id')).order_by(
+        'student_id', 'submission_date', 'id')
+    for mark in marks.iterator(chunk_size=2000):
+        latest_marks[mark.student_id] = mark
+
+    CurrentStudentMarks.objects.bulk_create([
+        CurrentStudentMarks(
+            student_id=student_id, latest_mark=mark, math=mark.math, eng=mark.eng, kis=mark.kis,
+            sci=mark.sci, sst=mark.sst, total_marks=mark.total_marks, submission_date=mark.submission_date,
+        )
+        for student_id, mark in latest_marks.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grading_system', '0003_studentmarks_student_fk'),
+        ('students_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CurrentStudentMarks',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('math', models.IntegerField()),
+                ('eng', models.IntegerField()),
+                ('kis', models.IntegerField()),
+                ('sci', models.IntegerField()),
+                ('sst', models.IntegerField()),
+                ('total_marks', models.IntegerField()),
+                ('submission_date', models.DateField()),
+                ('latest_mark', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='grading_system.studentmarks')),
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='current_marks', to='students_app.student')),
+            ],
+            options={
+                'verbose_name': 'Current Student Mark',
+                'verbose_name_plural': 'Current Student Marks',
+            },
+        ),
+        migrations.RunPython(populate_current_marks, migrations.RunPython.noop),
+    ]
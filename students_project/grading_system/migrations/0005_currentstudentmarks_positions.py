@@ -0,0 +1,42 @@
+# Generated by Django 5.2 on 2026-10-18 08:32
+
+from django.db import migrations, models
+from django.db.models import F, Window
+from django.db.models.functions import Rank
+
+
+def populate_positions(apps, schema_editor):
+    CurrentStudentMarks = apps.get_model('grading_system', 'CurrentStudentMarks')
+
+    total = F('math') + F('eng') + F('kis') + F('sci') + F('sst')
+    ranked = CurrentStudentMarks.objects.annotate(
+        new_class_position=Window(Rank(), partition_by=F('student__class_name'), order_by=total.desc()),
+        new_school_position=Window(Rank(), order_by=total.desc()),
+    )
+    current_marks = []
+    for current in ranked.iterator(chunk_size=2000):
+        current.class_position = current.new_class_position
+        current.school_position = current.new_school_position
+        current_marks.append(current)
+    CurrentStudentMarks.objects.bulk_update(current_marks, ['class_position', 'school_position'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grading_system', '0004_currentstudentmarks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='currentstudentmarks',
+            name='class_position',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='currentstudentmarks',
+            name='school_position',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(populate_positions, migrations.RunPython.noop),
+    ]
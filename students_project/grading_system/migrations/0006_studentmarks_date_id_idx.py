@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 08:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grading_system', '0005_currentstudentmarks_positions'),
+        ('students_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='studentmarks',
+            index=models.Index(fields=['-submission_date', '-id'], name='marks_date_id_idx'),
+        ),
+    ]
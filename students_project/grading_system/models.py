@@ -4,7 +4,11 @@ from datetime import datetime, timedelta
 
 
 class StudentMarks(models.Model):
-    student_id = models.IntegerField()
+    # Marks outlive the student record (see student_exists in get_all_student_marks),
+    # so the relation is not enforced by a database constraint. The composite index
+    # below leads with student, which makes a separate single-column index redundant.
+    student = models.ForeignKey('students_app.Student', on_delete=models.DO_NOTHING, db_constraint=False,
+                                db_index=False, related_name='marks')
     math = models.IntegerField()
     eng = models.IntegerField()
     kis = models.IntegerField()
@@ -16,6 +20,66 @@ class StudentMarks(models.Model):
     class Meta:
         verbose_name = 'Student Mark'
         verbose_name_plural = 'Student Marks'
+        indexes = [
+            # Serves "latest mark for student" lookups: filter on student, order by -submission_date
+            models.Index(fields=['student', '-submission_date'], name='marks_student_latest_idx'),
+            # Serves keyset pagination of the full marks listing, newest first
+            models.Index(fields=['-submission_date', '-id'], name='marks_date_id_idx'),
+        ]
 
     def __str__(self):
-        return f"Student #{self.student_id} - {self.submission_date}"
\ No newline at end of file
+        return f"Student #{self.student_id} - {self.submission_date}"
+
+
+class CurrentStudentMarks(models.Model):
+    """
+    The latest StudentMarks row for each student, denormalized into one row per student.
+    Kept in sync by every marks write and rebuilt with the rebuild_current_marks command.
+    """
+    student = models.OneToOneField('students_app.Student', on_delete=models.CASCADE, related_name='current_marks')
+    latest_mark = models.OneToOneField(StudentMarks, on_delete=models.CASCADE, related_name='+')
+    math = models.IntegerField()
+    eng = models.IntegerField()
+    kis = models.IntegerField()
+    sci = models.IntegerField()
+    sst = models.IntegerField()
+    total_marks = models.IntegerField()
+    submission_date = models.DateField()
+    # Tie-aware RANK() positions by total marks, maintained by refresh_rankings
+    class_position = models.IntegerField(blank=True, null=True)
+    school_position = models.IntegerField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = 'Current Student Mark'
+        verbose_name_plural = 'Current Student Marks'
+
+    def __str__(self):
+        return f"Student #{self.student_id} - {self.submission_date} (current)"
+
+
+class GradeSubmissionJob(models.Model):
+    """A queued submit_grades batch drained by the process_grade_jobs management command"""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    )
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', db_index=True)
+    marks = models.JSONField()
+    total_rows = models.IntegerField(default=0)
+    processed_rows = models.IntegerField(default=0)
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['created_at']
+        verbose_name = 'Grade Submission Job'
+        verbose_name_plural = 'Grade Submission Jobs'
+
+    def __str__(self):
+        return f"Grade submission job #{self.id} ({self.status})"
@@ -0,0 +1,41 @@
+# grading_system/signals.py
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from students_app.models import Student
+from .cache import STUDENTS, bump_versions, class_scope, invalidate_marks, student_scope
+from .models import StudentMarks
+from .utils import refresh_current_marks, refresh_rankings
+
+
+@receiver(post_save, sender=StudentMarks)
+@receiver(post_delete, sender=StudentMarks)
+def marks_changed(sender, instance, **kwargs):
+    """Keep current marks, positions and cached reads in sync with a mark saved or deleted one row at a time"""
+    refresh_current_marks([instance.student_id])
+    class_names = Student.objects.filter(id=instance.student_id).values_list('class_name', flat=True)
+    invalidate_marks([instance.student_id], list(class_names))
+
+
+@receiver(pre_save, sender=Student)
+def remember_previous_class(sender, instance, **kwargs):
+    """Record the class a student is moving out of so both classes are invalidated"""
+    instance._previous_class_name = None
+    if instance.pk:
+        instance._previous_class_name = (
+            Student.objects.filter(pk=instance.pk).values_list('class_name', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def student_changed(sender, instance, **kwargs):
+    """Invalidate cached reads covering a student created, edited, moved or deleted"""
+    class_names = {instance.class_name, getattr(instance, '_previous_class_name', None)} - {None}
+    bump_versions(
+        [STUDENTS, student_scope(instance.pk)] + [class_scope(class_name) for class_name in class_names]
+    )
+
+    # Moving or deleting a ranked student shifts the positions of their classmates
+    if len(class_names) > 1 or kwargs.get('signal') is post_delete:
+        refresh_rankings()
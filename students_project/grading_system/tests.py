@@ -1,3 +1,384 @@
-from django.test import TestCase
+import json
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+
+from students_app.models import Student
+from .models import CurrentStudentMarks, GradeSubmissionJob, StudentMarks
+from . import views
+from .utils import claim_next_grade_job, paginate_marks, process_grade_job
+
+
+class GetAllStudentMarksTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def create_marks(self, count):
+        for i in range(count):
+            student = Student.objects.create(first_name=f'Student{i}', last_name='Test',
+                                             student_id=str(i), class_name='Grade 1')
+            StudentMarks.objects.create(student=student, math=50, eng=50, kis=50, sci=50, sst=50, total_marks=250)
+
+    def get_all_student_marks(self):
+        response = views.get_all_student_marks(self.factory.get('/api/student-marks/'))
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.create_marks(3)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.get_all_student_marks()), 3)
+
+        self.create_marks(30)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.get_all_student_marks()), 33)
+
+    def test_marks_of_deleted_students_are_flagged(self):
+        self.create_marks(1)
+        StudentMarks.objects.create(student_id=999, math=1, eng=1, kis=1, sci=1, sst=1, total_marks=5)
+
+        marks = {mark['student']: mark for mark in self.get_all_student_marks()}
+
+        self.assertFalse(marks[999]['student_exists'])
+        self.assertIsNone(marks[999]['class_name'])
+        existing = next(mark for student, mark in marks.items() if student != 999)
+        self.assertTrue(existing['student_exists'])
+        self.assertEqual(existing['class_name'], 'Grade 1')
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.student = Student.objects.create(first_name='Student', last_name='Test', student_id='1',
+                                              class_name='Grade 1')
+        self.mark = StudentMarks.objects.create(student=self.student, math=50, eng=50, kis=50, sci=50, sst=50,
+                                                total_marks=250)
+
+    def get_student_marks(self, **headers):
+        return views.get_student_marks(self.factory.get('/api/get_by_student/', {'id': self.student.id}, **headers))
+
+    def test_unchanged_marks_revalidate_to_304(self):
+        response = self.get_student_marks()
+        self.assertEqual(response.status_code, 200)
+
+        response = self.get_student_marks(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_unnormalized_student_id_sees_writes(self):
+        request_id = f'0{self.student.id}'
+        response = views.get_student_marks(self.factory.get('/api/get_by_student/', {'id': request_id}))
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        self.mark.math = 90
+        self.mark.save()
+
+        response = views.get_student_marks(self.factory.get('/api/get_by_student/', {'id': request_id},
+                                                            HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['marks'][0]['math'], 90)
+
+    def test_non_numeric_student_id_is_rejected(self):
+        response = views.get_student_marks(self.factory.get('/api/get_by_student/', {'id': 'abc'}))
+        self.assertEqual(response.status_code, 400)
+
+    def test_write_in_the_same_second_is_not_served_stale(self):
+        response = self.get_student_marks()
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        self.mark.math = 90
+        self.mark.save()
+
+        # Whatever the client revalidates with, the write made after its fetch is returned
+        for headers in ({'HTTP_IF_NONE_MATCH': etag}, {'HTTP_IF_MODIFIED_SINCE': http_date()}):
+            response = self.get_student_marks(**headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.content)['marks'][0]['math'], 90)
+
+
+class PaginateMarksTests(TestCase):
+    def test_pages_cover_every_mark_once_across_same_day_ties(self):
+        student = Student.objects.create(first_name='Student', last_name='Test', student_id='1',
+                                         class_name='Grade 1')
+        for i in range(11):
+            StudentMarks.objects.create(student=student, math=1, eng=1, kis=1, sci=1, sst=1, total_marks=5,
+                                        submission_date=date(2026, 1, 1 + i // 4))
+
+        served, cursor = [], None
+        while True:
+            page, cursor = paginate_marks(StudentMarks.objects.all(), cursor, page_size=3)
+            served.extend((mark.submission_date, mark.id) for mark in page)
+            if cursor is None:
+                break
+
+        expected = sorted(StudentMarks.objects.values_list('submission_date', 'id'), reverse=True)
+        self.assertEqual(served, expected)
+
+
+class UpdateStudentMarksTests(TestCase):
+    def test_failed_refresh_rolls_back_the_mark(self):
+        student = Student.objects.create(first_name='Student', last_name='Test', student_id='1',
+                                         class_name='Grade 1')
+        body = {'student': student.id, 'math_marks': 50, 'english_marks': 50, 'kiswahili_marks': 50,
+                'science_marks': 50, 'sst_marks': 50}
+
+        with mock.patch('grading_system.utils.refresh_rankings', side_effect=RuntimeError('ranking failed')):
+            response = views.update_student_marks(RequestFactory().post(
+                '/api/update-marks/', json.dumps(body), content_type='application/json'))
+
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(StudentMarks.objects.filter(student=student).exists())
+
+
+class RankingTests(TestCase):
+    def add_student(self, name, class_name, total):
+        student = Student.objects.create(first_name=name, last_name='Test', student_id=name, class_name=class_name)
+        # Positions rank the five-subject sum, so the whole total goes in math
+        StudentMarks.objects.create(student=student, math=total, eng=0, kis=0, sci=0, sst=0, total_marks=total)
+        return student
+
+    def positions(self):
+        return {current.student.first_name: (current.class_position, current.school_position)
+                for current in CurrentStudentMarks.objects.select_related('student')}
+
+    def setUp(self):
+        self.a = self.add_student('a', 'Grade 1', 90)
+        self.b = self.add_student('b', 'Grade 1', 90)
+        self.c = self.add_student('c', 'Grade 1', 80)
+        self.d = self.add_student('d', 'Grade 2', 95)
+        self.e = self.add_student('e', 'Grade 2', 80)
+
+    def test_ties_share_a_position_and_the_next_one_skips(self):
+        self.assertEqual(self.positions(), {
+            'a': (1, 2), 'b': (1, 2), 'c': (3, 4),
+            'd': (1, 1), 'e': (2, 4),
+        })
+
+    def test_moving_a_student_reranks_both_classes(self):
+        self.d.class_name = 'Grade 1'
+        self.d.save()
+
+        self.assertEqual(self.positions(), {
+            'a': (2, 2), 'b': (2, 2), 'c': (4, 4),
+            'd': (1, 1), 'e': (1, 4),
+        })
+
+    def test_deleting_a_student_reranks_the_rest(self):
+        self.a.delete()
+
+        self.assertEqual(self.positions(), {
+            'b': (1, 2), 'c': (2, 3),
+            'd': (1, 1), 'e': (2, 3),
+        })
+
+    def test_editing_a_mark_reranks(self):
+        mark = StudentMarks.objects.get(student=self.c)
+        mark.math = 100
+        mark.save()
+
+        self.assertEqual(self.positions()['c'], (1, 1))
+        self.assertEqual(self.positions()['a'], (2, 3))
+
+
+class GradeSubmissionJobTests(TestCase):
+    MARKS = {'Math': 50, 'Eng': 60, 'Kis': 70, 'Sci': 80, 'SST': 90}
+
+    def test_rows_that_are_not_objects_are_rejected_before_queueing(self):
+        response = views.submit_grades(RequestFactory().post(
+            '/api/submit-grades/?async=1', json.dumps({'marks': [1, 2]}), content_type='application/json'))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(GradeSubmissionJob.objects.exists())
+
+    def test_bad_row_does_not_stop_later_chunks(self):
+        students = [Student.objects.create(first_name=f'Student{i}', last_name='Test', student_id=str(i),
+                                           class_name='Grade 1') for i in range(3)]
+        marks = [
+            {'id': students[0].id, 'subject_marks': {**self.MARKS, 'Math': 'abc'}, 'total_marks': 300},
+            {'id': students[1].id, 'subject_marks': self.MARKS},
+            {'id': students[2].id, 'subject_marks': self.MARKS},
+        ]
+        job = GradeSubmissionJob.objects.create(status='running', marks=marks, total_rows=3)
+
+        job = process_grade_job(job, chunk_size=1)
+
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(job.processed_rows, 3)
+        self.assertEqual(job.result['status_code'], 207)
+        self.assertEqual(set(StudentMarks.objects.values_list('student_id', flat=True)),
+                         {students[1].id, students[2].id})
+
+
+class ClaimNextGradeJobTests(TestCase):
+    def test_jobs_abandoned_by_a_dead_worker_are_failed(self):
+        stale = GradeSubmissionJob.objects.create(status='running', marks=[], total_rows=10, processed_rows=4,
+                                                  started_at=timezone.now() - timedelta(hours=2))
+        busy = GradeSubmissionJob.objects.create(status='running', marks=[], started_at=timezone.now())
+
+        with self.settings(GRADE_JOB_TIMEOUT=3600):
+            self.assertIsNone(claim_next_grade_job())
+
+        stale.refresh_from_db()
+        busy.refresh_from_db()
+        self.assertEqual(stale.status, 'failed')
+        self.assertEqual(stale.processed_rows, 4)
+        self.assertIsNotNone(stale.finished_at)
+        self.assertEqual(busy.status, 'running')
+
+
+class SubmitGradesTests(TestCase):
+    MARKS = {'Math': 50, 'Eng': 60, 'Kis': 70, 'Sci': 80, 'SST': 90}
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def create_students(self, count, offset=0):
+        return [Student.objects.create(first_name=f'Student{i}', last_name='Test', student_id=str(i),
+                                       class_name='Grade 1') for i in range(offset, offset + count)]
+
+    def submit(self, marks):
+        response = views.submit_grades(self.factory.post(
+            '/api/submit-grades/', json.dumps({'marks': marks}), content_type='application/json'))
+        return response.status_code, json.loads(response.content)
+
+    def test_all_valid_rows_are_saved(self):
+        students = self.create_students(2)
+
+        status, body = self.submit([{'id': student.id, 'subject_marks': self.MARKS} for student in students])
+
+        self.assertEqual(status, 200)
+        self.assertEqual(len(body['submitted']), 2)
+        self.assertEqual(StudentMarks.objects.get(student=students[0]).total_marks, 350)
+
+    def test_invalid_rows_fail_alone(self):
+        valid, invalid = self.create_students(2)
+
+        status, body = self.submit([
+            {'id': valid.id, 'subject_marks': self.MARKS},
+            {'id': invalid.id, 'subject_marks': {**self.MARKS, 'Math': 'abc'}, 'total_marks': 300},
+            {'id': invalid.id, 'subject_marks': {**self.MARKS, 'Eng': None}},
+            {'id': 999, 'subject_marks': self.MARKS},
+            'not a mark',
+        ])
+
+        self.assertEqual(status, 207)
+        self.assertEqual([row['id'] for row in body['submitted']], [valid.id])
+        self.assertEqual([row['error'] for row in body['errors']], [
+            'Marks must be whole numbers',
+            'Marks must be whole numbers',
+            'Student with ID 999 does not exist',
+            'Expected a mark object',
+        ])
+        self.assertEqual(list(StudentMarks.objects.values_list('student_id', flat=True)), [valid.id])
+
+    def test_all_rows_failing_returns_400(self):
+        student = self.create_students(1)[0]
+
+        status, body = self.submit([{'id': student.id, 'subject_marks': {'Math': 50}}])
+
+        self.assertEqual(status, 400)
+        self.assertEqual(body['submitted'], [])
+        self.assertFalse(StudentMarks.objects.exists())
+
+    def test_student_listed_twice_is_saved_once(self):
+        student = self.create_students(1)[0]
+
+        status, body = self.submit([{'id': student.id, 'subject_marks': self.MARKS}] * 2)
+
+        self.assertEqual(status, 207)
+        self.assertIn('within 7 days', body['errors'][0]['error'])
+        self.assertEqual(StudentMarks.objects.filter(student=student).count(), 1)
+
+    def test_rows_the_database_rejects_fail_alone(self):
+        valid, invalid = self.create_students(2)
+
+        # Passes validation but does not fit the integer column
+        status, body = self.submit([
+            {'id': valid.id, 'subject_marks': self.MARKS},
+            {'id': invalid.id, 'subject_marks': {**self.MARKS, 'Math': 10 ** 20}},
+        ])
+
+        self.assertEqual(status, 207)
+        self.assertEqual([row['id'] for row in body['submitted']], [valid.id])
+        self.assertEqual([row['id'] for row in body['errors']], [invalid.id])
+        self.assertEqual(list(StudentMarks.objects.values_list('student_id', flat=True)), [valid.id])
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        query_counts = []
+        for count, offset in ((3, 0), (30, 3)):
+            students = self.create_students(count, offset)
+            with CaptureQueriesContext(connection) as queries:
+                status, _ = self.submit([{'id': student.id, 'subject_marks': self.MARKS} for student in students])
+            self.assertEqual(status, 200)
+            query_counts.append(len(queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
+
+
+class IngestGradesTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.students = [Student.objects.create(first_name=f'Student{i}', last_name='Test', student_id=str(i),
+                                                class_name='Grade 1') for i in range(3)]
+
+    def ingest(self, body, content_type):
+        response = views.ingest_grades(self.factory.post('/api/ingest/', body, content_type=content_type))
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_ndjson_reports_malformed_lines_and_values(self):
+        first, second, third = self.students
+        marks = {'Math': 50, 'Eng': 60, 'Kis': 70, 'Sci': 80, 'SST': 90}
+        lines = [
+            json.dumps({'id': first.id, 'subject_marks': marks}),
+            '{not json',
+            json.dumps([1, 2]),
+            json.dumps({'id': second.id, 'subject_marks': {**marks, 'Math': 'a'}}),
+            json.dumps({'id': second.id, 'subject_marks': marks, 'total_marks': 'abc'}),
+            json.dumps({'id': third.id, 'subject_marks': marks}),
+        ]
+
+        with self.settings(GRADES_INGEST_CHUNK_SIZE=2):
+            results = self.ingest('\n'.join(lines), 'application/x-ndjson')
+
+        self.assertEqual(len(results), 4)
+        errors = [error['error'] for result in results[:3] for error in result['errors']]
+        self.assertEqual(errors, [
+            'Invalid JSON data on line 2',
+            'Expected a mark object on line 3',
+            'Marks must be whole numbers on line 4',
+            'Marks must be whole numbers on line 5',
+        ])
+        self.assertEqual(results[-1], {'detail': 'Some submissions were successful', 'submitted_count': 2,
+                                       'failed_count': 4})
+        self.assertEqual(set(StudentMarks.objects.values_list('student_id', flat=True)), {first.id, third.id})
+
+    def test_csv_reports_malformed_values(self):
+        first, second, third = self.students
+        rows = [
+            'id,Math,Eng,Kis,Sci,SST',
+            f'{first.id},50,60,70,80,90',
+            f'{second.id},abc,60,70,80,90',
+            f'{third.id},50,60,70,80',
+            '999,50,60,70,80,90',
+        ]
+
+        results = self.ingest('\n'.join(rows), 'text/csv')
+
+        self.assertEqual([row['id'] for row in results[0]['submitted']], [str(first.id)])
+        self.assertEqual([error['error'] for error in results[0]['errors']], [
+            'Marks must be whole numbers',
+            'Missing marks for subjects: SST',
+            'Student with ID 999 does not exist',
+        ])
+        self.assertEqual(results[-1]['failed_count'], 3)
+
+    def test_unsupported_content_type(self):
+        response = views.ingest_grades(self.factory.post('/api/ingest/', '{}', content_type='application/json'))
+        self.assertEqual(response.status_code, 415)
@@ -4,8 +4,12 @@ from grading_system import views
 
 urlpatterns = [
     path('api/student-marks/submit_grades/', views.submit_grades, name='submit_grades'),
+    path('api/student-marks/ingest/', views.ingest_grades, name='ingest_grades'),
+    path('api/student-marks/jobs/<int:job_id>/', views.get_submission_job, name='grade_submission_job'),
     path('api/student-marks/get_by_student/', views.get_student_marks, name='get_student_marks'),
     path('api/student-marks/get_by_class/', views.get_class_marks, name='get_class_marks'),
+    path('api/student-marks/statistics/', views.get_class_statistics, name='get_class_statistics'),
+    path('api/student-marks/rankings/', views.get_rankings, name='get_rankings'),
     path('api/student-marks/', views.get_all_student_marks, name='get_all_student_marks'),
     path('api/student-marks/update_student_marks/', views.update_student_marks, name='update_student_marks'),
 ]
\ No newline at end of file
@@ -0,0 +1,785 @@
+# grading_system/utils.py
+import base64
+import csv
+import json
+from datetime import datetime, timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import (
+    Aggregate, Avg, BooleanField, Count, F, FloatField, Max, Min, OuterRef, Q, Subquery, Window,
+)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Rank, RowNumber
+from django.utils import timezone
+
+from .cache import invalidate_marks
+from .models import CurrentStudentMarks, GradeSubmissionJob, StudentMarks
+from students_app.models import Student
+
+REQUIRED_SUBJECTS = ['Math', 'Eng', 'Kis', 'Sci', 'SST']
+
+# Grade bands as (lowest mark, grade), best first; None marks the catch-all lowest band
+GRADE_BANDS = [(70, 'E.E'), (60, 'M.E'), (40, 'A.E'), (None, 'B.E')]
+
+
+def _student_pk(student_id):
+    """Coerce a submitted student ID to a primary key, or None if it is not numeric"""
+    try:
+        return int(student_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_mark(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def validate_marks_batch(marks_data, today=None):
+    """
+    Validate a batch of submitted marks in memory.
+
+    All referenced students and their latest submission dates are loaded up front,
+    so the whole batch costs two queries regardless of its size. Returns a tuple of
+    (new_marks, successful_submissions, failed_submissions) where new_marks are
+    unsaved StudentMarks instances for the accepted rows.
+    """
+    today = today or timezone.now().date()
+
+    student_ids = {_student_pk(mark.get('id')) for mark in marks_data if isinstance(mark, dict)} - {None}
+    students = Student.objects.in_bulk(student_ids)
+    last_submissions = dict(
+        StudentMarks.objects.filter(student_id__in=students.keys())
+        .values('student_id')
+        .annotate(last_submission=Max('submission_date'))
+        .values_list('student_id', 'last_submission')
+    )
+
+    new_marks = []
+    successful_submissions = []
+    failed_submissions = []
+
+    for mark in marks_data:
+        if not isinstance(mark, dict):
+            failed_submissions.append({
+                'id': None,
+                'error': 'Expected a mark object'
+            })
+            continue
+
+        student_id = mark.get('id')
+        subject_marks = mark.get('subject_marks', {})
+        total_marks = mark.get('total_marks', 0)
+
+        # Validate required fields
+        if not student_id:
+            failed_submissions.append({
+                'id': student_id,
+                'error': 'Missing student ID'
+            })
+            continue
+
+        # Check if student exists in students_app_student
+        student = students.get(_student_pk(student_id))
+        if student is None:
+            failed_submissions.append({
+                'id': student_id,
+                'error': f'Student with ID {student_id} does not exist'
+            })
+            continue
+
+        # Check for missing subjects
+        if not isinstance(subject_marks, dict):
+            subject_marks = {}
+        missing_subjects = [subject for subject in REQUIRED_SUBJECTS if subject not in subject_marks]
+        if missing_subjects:
+            failed_submissions.append({
+                'id': student_id,
+                'error': f'Missing marks for subjects: {", ".join(missing_subjects)}'
+            })
+            continue
+
+        # Check mark types, so a bad value fails its own row rather than the batch insert
+        if not all(_is_mark(subject_marks[subject]) for subject in REQUIRED_SUBJECTS) or (
+                total_marks and not _is_mark(total_marks)):
+            failed_submissions.append({
+                'id': student_id,
+                'error': 'Marks must be whole numbers'
+            })
+            continue
+
+        # Calculate total marks if not provided
+        if not total_marks:
+            total_marks = sum(subject_marks[subject] for subject in REQUIRED_SUBJECTS)
+
+        # Check 7-day rule: Cannot submit new grades within 7 days of previous submission
+        last_submission = last_submissions.get(student.id)
+        if last_submission and (today - last_submission).days < 7:
+            failed_submissions.append({
+                'id': student_id,
+                'name': f"{student.first_name} {student.last_name}",
+                'error': f'Cannot submit new grades within 7 days of the previous submission. Last submission: {last_submission.strftime("%Y-%m-%d")}'
+            })
+            continue
+
+        # A student listed twice in one batch is subject to the same rule
+        last_submissions[student.id] = today
+
+        new_marks.append(StudentMarks(
+            student=student,
+            math=subject_marks['Math'],
+            eng=subject_marks['Eng'],
+            kis=subject_marks['Kis'],
+            sci=subject_marks['Sci'],
+            sst=subject_marks['SST'],
+            total_marks=total_marks,
+            submission_date=today
+        ))
+        successful_submissions.append({
+            'id': student_id,
+            'name': f"{student.first_name} {student.last_name}"
+        })
+
+    return new_marks, successful_submissions, failed_submissions
+
+
+def _refresh_after_insert(new_marks):
+    student_ids = {mark.student_id for mark in new_marks}
+    refresh_current_marks(student_ids)
+    # bulk_create sends no post_save signals, so invalidate cached reads here
+    invalidate_marks(student_ids, {mark.student.class_name for mark in new_marks})
+
+
+def save_marks_batch(marks_data, today=None):
+    """
+    Validate a batch of submitted marks and insert the accepted rows with one bulk_create.
+
+    Returns (successful_submissions, failed_submissions). If the bulk insert fails, the
+    accepted rows are retried one at a time so only the rows the database rejects are
+    reported as failed.
+    """
+    new_marks, successful_submissions, failed_submissions = validate_marks_batch(marks_data, today)
+
+    if not new_marks:
+        return successful_submissions, failed_submissions
+
+    try:
+        with transaction.atomic():
+            StudentMarks.objects.bulk_create(new_marks)
+            _refresh_after_insert(new_marks)
+        return successful_submissions, failed_submissions
+    except Exception:
+        pass
+
+    saved_marks = []
+    saved_submissions = []
+    try:
+        with transaction.atomic():
+            for mark, submission in zip(new_marks, successful_submissions):
+                try:
+                    with transaction.atomic():
+                        StudentMarks.objects.bulk_create([mark])
+                except Exception as e:
+                    failed_submissions.append({'id': submission['id'], 'error': str(e)})
+                else:
+                    saved_marks.append(mark)
+                    saved_submissions.append(submission)
+            if saved_marks:
+                _refresh_after_insert(saved_marks)
+    except Exception as e:
+        failed_submissions.extend({'id': submission['id'], 'error': str(e)} for submission in saved_submissions)
+        saved_submissions = []
+
+    return saved_submissions, failed_submissions
+
+
+def latest_marks(marks=None):
+    """
+    Narrow a StudentMarks queryset to the latest row per student in a single query.
+
+    The newest submission_date wins, with the highest id breaking same-day ties. On
+    PostgreSQL this is a DISTINCT ON served by the (student, -submission_date) index;
+    other databases use a ROW_NUMBER() window partitioned by student.
+    """
+    marks = StudentMarks.objects.all() if marks is None else marks
+    if connection.features.can_distinct_on_fields:
+        return marks.order_by('student_id', '-submission_date', '-id').distinct('student_id')
+    return marks.annotate(
+        row_number=Window(
+            RowNumber(),
+            partition_by=F('student_id'),
+            order_by=[F('submission_date').desc(), F('id').desc()],
+        )
+    ).filter(row_number=1)
+
+
+# Application-wide key for the PostgreSQL advisory lock taken by lock_rankings
+RANKINGS_LOCK_ID = 0x6d61726b
+
+
+def lock_rankings():
+    """
+    Serialize writers of current marks and positions until the current transaction ends.
+
+    Ranking reads every row, so two transactions ranking at once would each miss the
+    other's uncommitted marks and leave duplicated or skipped positions. On PostgreSQL a
+    transaction-scoped advisory lock makes the second writer wait; its ranking query then
+    runs with a fresh READ COMMITTED snapshot that includes the first writer's rows.
+    SQLite already allows only one writing transaction at a time.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [RANKINGS_LOCK_ID])
+
+
+CURRENT_MARKS_FIELDS = ['latest_mark', 'math', 'eng', 'kis', 'sci', 'sst', 'total_marks', 'submission_date']
+
+
+def refresh_current_marks(student_ids=None):
+    """
+    Recompute CurrentStudentMarks for the given students, or for every student when None.
+
+    The latest mark is the one with the newest submission_date, with the highest id
+    breaking ties between same-day records. Returns the number of current rows written.
+    """
+    students = Student.objects.all() if student_ids is None else Student.objects.filter(id__in=student_ids)
+    marks = latest_marks(StudentMarks.objects.filter(student_id__in=students.values('id')))
+
+    with transaction.atomic():
+        # Lock before reading the latest marks, so a concurrent writer for the same student
+        # cannot overwrite this refresh with an older mark, and before upserting, so a
+        # concurrent ranking never waits on these rows while holding the lock
+        lock_rankings()
+        latest = {mark.student_id: mark for mark in marks.iterator(chunk_size=2000)}
+
+        current_marks = [
+            CurrentStudentMarks(
+                student_id=student_id,
+                latest_mark=mark,
+                math=mark.math,
+                eng=mark.eng,
+                kis=mark.kis,
+                sci=mark.sci,
+                sst=mark.sst,
+                total_marks=mark.total_marks,
+                submission_date=mark.submission_date,
+            )
+            for student_id, mark in latest.items()
+        ]
+
+        stale = CurrentStudentMarks.objects.all()
+        if student_ids is not None:
+            stale = stale.filter(student_id__in=student_ids)
+        stale.exclude(student_id__in=latest.keys()).delete()
+        CurrentStudentMarks.objects.bulk_create(
+            current_marks,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['student'],
+            update_fields=CURRENT_MARKS_FIELDS,
+        )
+        refresh_rankings()
+
+    return len(current_marks)
+
+
+def refresh_rankings():
+    """
+    Recompute class and school positions of every CurrentStudentMarks row.
+
+    Positions come from a RANK() window over the five-subject total, so tied students
+    share a position and the next one skips ahead (1, 1, 3). All positions are computed
+    in one query and only rows whose position changed are written back, under
+    lock_rankings so concurrent writers rank one after the other.
+    Returns the number of rows updated.
+    """
+    total = F('math') + F('eng') + F('kis') + F('sci') + F('sst')
+    ranked = CurrentStudentMarks.objects.annotate(
+        new_class_position=Window(Rank(), partition_by=F('student__class_name'), order_by=total.desc()),
+        new_school_position=Window(Rank(), order_by=total.desc()),
+    ).only('id', 'class_position', 'school_position')
+
+    with transaction.atomic():
+        lock_rankings()
+        changed = []
+        for current in ranked.iterator(chunk_size=2000):
+            if (current.class_position, current.school_position) != (current.new_class_position,
+                                                                     current.new_school_position):
+                current.class_position = current.new_class_position
+                current.school_position = current.new_school_position
+                changed.append(current)
+
+        CurrentStudentMarks.objects.bulk_update(changed, ['class_position', 'school_position'], batch_size=1000)
+    return len(changed)
+
+
+def ranked_students(class_name=None):
+    """Current marks with their stored positions, best first, optionally limited to one class"""
+    current_marks = CurrentStudentMarks.objects.select_related('student')
+    if class_name:
+        current_marks = current_marks.filter(student__class_name=class_name)
+        return current_marks.order_by('class_position', 'student__first_name', 'student__last_name')
+    return current_marks.order_by('school_position', 'student__first_name', 'student__last_name')
+
+
+def class_positions(student_ids):
+    """Map each student ID to their stored class position; students without marks are omitted"""
+    return dict(
+        CurrentStudentMarks.objects.filter(student_id__in=student_ids).values_list('student_id', 'class_position')
+    )
+
+
+def summarize_submissions(successful_submissions, failed_submissions):
+    """Build the submit_grades response body and HTTP status for a processed batch"""
+    if not successful_submissions and failed_submissions:
+        # If all submissions failed, return error status
+        return {
+            'detail': 'All submissions failed',
+            'errors': failed_submissions,
+            'submitted': []
+        }, 400
+    elif failed_submissions:
+        # If some submissions failed, return partial success (207 Multi-Status)
+        return {
+            'detail': 'Some submissions were successful',
+            'errors': failed_submissions,
+            'submitted': successful_submissions
+        }, 207
+    # If all submissions succeeded
+    return {
+        'detail': 'All grades submitted successfully',
+        'submitted': successful_submissions
+    }, 200
+
+
+def iter_ndjson_marks(lines):
+    """
+    Parse newline-delimited JSON marks, one submit_grades-style mark object per line.
+
+    Yields (mark, error) tuples so a malformed line is reported without aborting the upload.
+    """
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            mark = json.loads(line)
+        except json.JSONDecodeError:
+            yield None, {'id': None, 'error': f'Invalid JSON data on line {line_number}'}
+            continue
+        if not isinstance(mark, dict):
+            yield None, {'id': None, 'error': f'Expected a mark object on line {line_number}'}
+            continue
+        subject_marks = mark.get('subject_marks', {})
+        total_marks = mark.get('total_marks')
+        if (not isinstance(subject_marks, dict) or not all(map(_is_mark, subject_marks.values()))
+                or (total_marks is not None and not _is_mark(total_marks))):
+            yield None, {'id': mark.get('id'), 'error': f'Marks must be whole numbers on line {line_number}'}
+            continue
+        yield mark, None
+
+
+def iter_csv_marks(lines):
+    """
+    Parse CSV marks with a header row of id, Math, Eng, Kis, Sci, SST and an optional total_marks.
+
+    Header names are case-insensitive and blank cells are treated as missing marks.
+    Yields (mark, error) tuples in the same shape as iter_ndjson_marks.
+    """
+    subjects = {subject.lower(): subject for subject in REQUIRED_SUBJECTS}
+    reader = csv.reader(lines)
+    header = [column.strip().lower() for column in next(reader, [])]
+
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        values = dict(zip(header, (cell.strip() for cell in row)))
+        student_id = values.get('id') or None
+        try:
+            subject_marks = {
+                subjects[column]: int(value)
+                for column, value in values.items()
+                if column in subjects and value != ''
+            }
+            total_marks = int(values['total_marks']) if values.get('total_marks') else 0
+        except ValueError:
+            yield None, {'id': student_id, 'error': 'Marks must be whole numbers'}
+            continue
+        yield {'id': student_id, 'subject_marks': subject_marks, 'total_marks': total_marks}, None
+
+
+def ingest_marks(rows, chunk_size):
+    """
+    Validate and commit parsed marks in fixed-size chunks.
+
+    Yields one result dict per committed chunk followed by a summary, so only a single
+    chunk of rows is ever held in memory.
+    """
+    today = timezone.now().date()
+    submitted_count = 0
+    failed_count = 0
+
+    try:
+        for chunk_number, chunk in enumerate(_chunked(rows, chunk_size), start=1):
+            marks_data = [mark for mark, error in chunk if error is None]
+            try:
+                successful_submissions, failed_submissions = save_marks_batch(marks_data, today)
+            except Exception as e:
+                # Report the chunk as failed and carry on, so the stream always reaches the summary
+                successful_submissions = []
+                failed_submissions = [{'id': mark.get('id'), 'error': str(e)} for mark in marks_data]
+            failed_submissions = [error for mark, error in chunk if error is not None] + failed_submissions
+
+            submitted_count += len(successful_submissions)
+            failed_count += len(failed_submissions)
+            yield {
+                'chunk': chunk_number,
+                'rows': len(chunk),
+                'submitted': successful_submissions,
+                'errors': failed_submissions,
+            }
+    except (UnicodeDecodeError, csv.Error) as e:
+        # The rest of the body cannot be read; report it and still send the summary
+        failed_count += 1
+        yield {'error': f'Could not read the rest of the upload: {e}'}
+
+    if not submitted_count and failed_count:
+        detail = 'All submissions failed'
+    elif failed_count:
+        detail = 'Some submissions were successful'
+    else:
+        detail = 'All grades submitted successfully'
+    yield {'detail': detail, 'submitted_count': submitted_count, 'failed_count': failed_count}
+
+
+def _chunked(iterable, size):
+    """Yield lists of at most size items from iterable"""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def fail_stale_grade_jobs(timeout=None):
+    """
+    Mark jobs left running for longer than timeout seconds (GRADE_JOB_TIMEOUT) as failed.
+
+    A worker that dies mid-job leaves it running forever. Its committed chunks cannot be
+    told apart from rows that would fail the 7-day rule on a retry, so the job is failed
+    with its progress rather than re-run. Returns the number of jobs failed.
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'GRADE_JOB_TIMEOUT', 3600)
+    now = timezone.now()
+    return GradeSubmissionJob.objects.filter(
+        status='running', started_at__lt=now - timedelta(seconds=timeout)
+    ).update(
+        status='failed',
+        finished_at=now,
+        error='The worker stopped before finishing; rows up to processed_rows were saved',
+    )
+
+
+def claim_next_grade_job():
+    """
+    Claim the oldest pending GradeSubmissionJob by flipping it to running.
+
+    The status is updated conditionally, so concurrent workers never process the same job.
+    Stale running jobs are failed first. Returns the claimed job, or None when the queue is empty.
+    """
+    fail_stale_grade_jobs()
+    while True:
+        job = GradeSubmissionJob.objects.filter(status='pending').order_by('created_at', 'id').first()
+        if job is None:
+            return None
+        claimed = GradeSubmissionJob.objects.filter(id=job.id, status='pending').update(
+            status='running', started_at=timezone.now()
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def process_grade_job(job, chunk_size):
+    """
+    Run a claimed GradeSubmissionJob through the bulk submission path chunk by chunk.
+
+    Progress is recorded after every chunk, and the final result holds the same
+    breakdown submit_grades returns, plus the HTTP status it would have used.
+    """
+    today = timezone.now().date()
+    successful_submissions = []
+    failed_submissions = []
+
+    try:
+        for chunk in _chunked(job.marks, chunk_size):
+            try:
+                successful, failed = save_marks_batch(chunk, today)
+            except Exception as e:
+                # A chunk that cannot be saved fails on its own; later chunks are still processed
+                successful = []
+                failed = [{'id': mark.get('id') if isinstance(mark, dict) else None, 'error': str(e)}
+                          for mark in chunk]
+            successful_submissions.extend(successful)
+            failed_submissions.extend(failed)
+            job.processed_rows += len(chunk)
+            GradeSubmissionJob.objects.filter(id=job.id).update(processed_rows=job.processed_rows)
+    except Exception as e:
+        job.status = 'failed'
+        job.error = str(e)
+    else:
+        payload, status = summarize_submissions(successful_submissions, failed_submissions)
+        job.status = 'completed'
+        job.result = {**payload, 'status_code': status}
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'result', 'processed_rows', 'finished_at'])
+    return job
+
+
+def filter_marks(marks, params):
+    """
+    Apply the optional class_name, student, date_from and date_to filters from a query string.
+
+    Dates use the YYYY-MM-DD format; a malformed value raises ValueError.
+    """
+    if params.get('class_name'):
+        marks = marks.filter(student__class_name=params['class_name'])
+    if params.get('student'):
+        marks = marks.filter(student_id=int(params['student']))
+    if params.get('date_from'):
+        marks = marks.filter(submission_date__gte=datetime.strptime(params['date_from'], '%Y-%m-%d').date())
+    if params.get('date_to'):
+        marks = marks.filter(submission_date__lte=datetime.strptime(params['date_to'], '%Y-%m-%d').date())
+    return marks
+
+
+def encode_marks_cursor(mark):
+    """Encode the (submission_date, id) position of a mark as an opaque pagination cursor"""
+    position = f"{mark.submission_date.strftime('%Y-%m-%d')}|{mark.id}"
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def paginate_marks(marks, cursor=None, page_size=100):
+    """
+    Return one keyset page of marks ordered newest first, and the cursor for the next page.
+
+    Rows are ordered by (submission_date, id) descending and the cursor records the last
+    row served. The cursor predicate is a row-value comparison on the same columns, so
+    marks_date_id_idx serves both the filter and the ordering and a page costs the same
+    however deep the client pages. A malformed cursor raises ValueError.
+    """
+    marks = marks.order_by('-submission_date', '-id')
+    if cursor:
+        try:
+            submission_date, mark_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            submission_date = datetime.strptime(submission_date, '%Y-%m-%d').date()
+            mark_id = int(mark_id)
+        except (ValueError, UnicodeDecodeError):
+            raise ValueError('Invalid cursor')
+        table = connection.ops.quote_name(StudentMarks._meta.db_table)
+        marks = marks.filter(RawSQL(
+            f'({table}.{connection.ops.quote_name("submission_date")}, {table}.{connection.ops.quote_name("id")})'
+            ' < (%s, %s)',
+            (submission_date, mark_id), output_field=BooleanField(),
+        ))
+
+    page = list(marks[:page_size + 1])
+    next_cursor = encode_marks_cursor(page[page_size - 1]) if len(page) > page_size else None
+    return page[:page_size], next_cursor
+
+
+def annotate_student_details(marks):
+    """
+    Annotate marks with their student's class as student_class in the same query.
+
+    A correlated subquery is used rather than a join so marks whose student has been
+    deleted are kept, with student_class set to None.
+    """
+    return marks.annotate(
+        student_class=Subquery(Student.objects.filter(id=OuterRef('student_id')).values('class_name')[:1])
+    )
+
+
+def _format_date(value):
+    return value.strftime('%Y-%m-%d') if value else None
+
+
+# Output fields of the get_all_student_marks listing: (queryset column, converter)
+MARK_LIST_FIELDS = {
+    'id': ('id', None),
+    'student': ('student_id', None),  # Foreign key to student
+    'student_exists': ('student_class', lambda value: value is not None),  # Flag to indicate if student exists
+    'class_name': ('student_class', None),  # Include class name directly with marks
+    'math_marks': ('math', None),
+    'english_marks': ('eng', None),
+    'kiswahili_marks': ('kis', None),
+    'science_marks': ('sci', None),
+    'sst_marks': ('sst', None),
+    'total_marks': ('total_marks', None),
+    'submission_date': ('submission_date', _format_date),
+}
+
+# Output fields of the per-student marks history in get_student_marks
+STUDENT_MARK_FIELDS = {
+    'id': ('id', None),
+    'math': ('math', None),
+    'eng': ('eng', None),
+    'kis': ('kis', None),
+    'sci': ('sci', None),
+    'sst': ('sst', None),
+    'total_marks': ('total_marks', None),
+    'submission_date': ('submission_date', _format_date),
+}
+
+
+def parse_fields(value, available):
+    """
+    Parse a comma-separated ?fields= projection, defaulting to every available field.
+    Unknown field names raise ValueError.
+    """
+    if not value:
+        return list(available)
+    fields = list(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in available]
+    if unknown or not fields:
+        raise ValueError(f'Unknown fields: {", ".join(unknown)}. Available fields: {", ".join(available)}')
+    return fields
+
+
+def project_marks(marks, fields, available):
+    """
+    Select only the columns behind the requested output fields with values_list().
+
+    submission_date and id are always selected so keyset cursors can be built from the
+    rows. Returns the named values_list queryset and a function turning one of its rows
+    into the list of requested field values.
+    """
+    columns = [available[field] for field in fields]
+    sources = list(dict.fromkeys([source for source, convert in columns] + ['submission_date', 'id']))
+
+    def row_values(row):
+        return [
+            convert(getattr(row, source)) if convert else getattr(row, source)
+            for source, convert in columns
+        ]
+
+    return marks.values_list(*sources, named=True), row_values
+
+
+def format_marks(rows, fields, row_values, columnar=False):
+    """
+    Format projected rows as a list of objects, or in columnar form as
+    {"columns": [...], "data": [[...], ...]} with one array of values per column.
+    """
+    values = [row_values(row) for row in rows]
+    if columnar:
+        return {'columns': fields, 'data': [list(column) for column in zip(*values)] or [[] for _ in fields]}
+    return [dict(zip(fields, row)) for row in values]
+
+
+def stream_marks_json(rows, fields, row_values, chunk_size=2000):
+    """
+    Serialize projected rows as a JSON array one piece at a time for a StreamingHttpResponse.
+
+    Rows are read with a server-side cursor in chunks of chunk_size and each chunk is
+    emitted as a single string, so memory use stays flat however many rows there are.
+    """
+    yield '['
+    separator = ''
+    objects = (json.dumps(dict(zip(fields, row_values(row)))) for row in rows.iterator(chunk_size=chunk_size))
+    for chunk in _chunked(objects, chunk_size):
+        yield separator + ','.join(chunk)
+        separator = ','
+    yield ']'
+
+
+class Median(Aggregate):
+    """PostgreSQL median via the PERCENTILE_CONT ordered-set aggregate"""
+    function = 'PERCENTILE_CONT'
+    name = 'Median'
+    template = '%(function)s(0.5) WITHIN GROUP (ORDER BY %(expressions)s)'
+    output_field = FloatField()
+
+
+def _median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if not values:
+        return None
+    return float(values[middle]) if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+
+
+def _band_filters(column):
+    """Q filters selecting each GRADE_BANDS band of a column, keyed by grade"""
+    filters = {}
+    upper_bound = None
+    for lower_bound, grade in GRADE_BANDS:
+        condition = Q()
+        if lower_bound is not None:
+            condition &= Q(**{f'{column}__gte': lower_bound})
+        if upper_bound is not None:
+            condition &= Q(**{f'{column}__lt': upper_bound})
+        filters[grade] = condition
+        upper_bound = lower_bound
+    return filters
+
+
+# Statistics columns of CurrentStudentMarks: subjects, then the average of the five
+STATISTICS_COLUMNS = ['math', 'eng', 'kis', 'sci', 'sst', 'average']
+
+
+def class_statistics(class_name=None):
+    """
+    Per-class, per-subject mean/min/max/median and grade band counts over the latest marks.
+
+    Everything is aggregated by the database in one grouped query over CurrentStudentMarks.
+    Medians use PERCENTILE_CONT on PostgreSQL; other databases get them from one extra
+    query that reads just the subject columns.
+    """
+    current_marks = CurrentStudentMarks.objects.annotate(
+        average=(F('math') + F('eng') + F('kis') + F('sci') + F('sst')) / 5.0
+    )
+    if class_name:
+        current_marks = current_marks.filter(student__class_name=class_name)
+
+    use_median_aggregate = connection.vendor == 'postgresql'
+    aggregates = {'students': Count('id')}
+    for column in STATISTICS_COLUMNS:
+        aggregates[f'{column}__mean'] = Avg(column)
+        aggregates[f'{column}__min'] = Min(column)
+        aggregates[f'{column}__max'] = Max(column)
+        if use_median_aggregate:
+            aggregates[f'{column}__median'] = Median(column)
+        for grade, condition in _band_filters(column).items():
+            aggregates[f'{column}__grade__{grade}'] = Count('id', filter=condition)
+
+    rows = current_marks.values('student__class_name').annotate(**aggregates).order_by('student__class_name')
+
+    medians = {}
+    if not use_median_aggregate:
+        values = {}
+        for row in current_marks.values_list('student__class_name', *STATISTICS_COLUMNS):
+            for column, value in zip(STATISTICS_COLUMNS, row[1:]):
+                values.setdefault((row[0], column), []).append(value)
+        medians = {key: _median(column_values) for key, column_values in values.items()}
+
+    statistics = []
+    for row in rows:
+        subjects = {}
+        for column in STATISTICS_COLUMNS:
+            mean = row[f'{column}__mean']
+            median = row.get(f'{column}__median', medians.get((row['student__class_name'], column)))
+            subjects[column] = {
+                'mean': round(mean, 2) if mean is not None else None,
+                'min': row[f'{column}__min'],
+                'max': row[f'{column}__max'],
+                'median': round(median, 2) if median is not None else None,
+                'grades': {grade: row[f'{column}__grade__{grade}'] for _, grade in GRADE_BANDS},
+            }
+        statistics.append({
+            'class_name': row['student__class_name'],
+            'students': row['students'],
+            'subjects': subjects,
+        })
+    return statistics
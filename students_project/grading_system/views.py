@@ -1,13 +1,22 @@
 # views.py
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.db import transaction
 from django.utils import timezone
+from django.conf import settings
+from django.urls import reverse
 from datetime import datetime, timedelta
+import codecs
 import json
 
-from .models import StudentMarks
+from .cache import MARKS, STUDENTS, class_scope, student_scope, versioned_cache, versioned_condition
+from .models import GradeSubmissionJob, StudentMarks
+from .utils import (
+    MARK_LIST_FIELDS, STUDENT_MARK_FIELDS, annotate_student_details, class_statistics, filter_marks, format_marks,
+    ingest_marks, iter_csv_marks, iter_ndjson_marks, latest_marks, paginate_marks, parse_fields, project_marks,
+    ranked_students, save_marks_batch, stream_marks_json, summarize_submissions,
+)
 from students_app.models import Student  # Import the Student model from students_app
 
 
@@ -23,109 +32,25 @@ def submit_grades(request):
 
         marks_data = data['marks']
 
-        # Lists to track submissions
-        successful_submissions = []
-        failed_submissions = []
+        # In async mode the batch is queued for the process_grade_jobs worker
+        if request.GET.get('async') in ('1', 'true'):
+            # Reject rows the worker could not even read before accepting the batch
+            if not all(isinstance(mark, dict) for mark in marks_data):
+                return JsonResponse({'detail': 'Invalid data format. Every mark must be an object.'}, status=400)
 
-        # Process each student's marks
-        for mark in marks_data:
-            student_id = mark.get('id')
-            subject_marks = mark.get('subject_marks', {})
-            total_marks = mark.get('total_marks', 0)
+            job = GradeSubmissionJob.objects.create(marks=marks_data, total_rows=len(marks_data))
+            return JsonResponse({
+                'detail': 'Grade submission queued',
+                'job_id': job.id,
+                'status': job.status,
+                'status_url': reverse('grade_submission_job', args=[job.id]),
+            }, status=202)
 
-            # Validate required fields
-            if not student_id:
-                failed_submissions.append({
-                    'id': student_id,
-                    'error': 'Missing student ID'
-                })
-                continue
+        # Validate the whole batch in memory and insert accepted rows in bulk
+        successful_submissions, failed_submissions = save_marks_batch(marks_data)
 
-            # Check if student exists in students_app_student
-            try:
-                student = Student.objects.get(id=student_id)
-            except Student.DoesNotExist:
-                failed_submissions.append({
-                    'id': student_id,
-                    'error': f'Student with ID {student_id} does not exist'
-                })
-                continue
-
-            # Check for missing subjects
-            required_subjects = ['Math', 'Eng', 'Kis', 'Sci', 'SST']
-            missing_subjects = [subject for subject in required_subjects if subject not in subject_marks]
-            if missing_subjects:
-                failed_submissions.append({
-                    'id': student_id,
-                    'error': f'Missing marks for subjects: {", ".join(missing_subjects)}'
-                })
-                continue
-
-            # Calculate total marks if not provided
-            if not total_marks:
-                total_marks = sum(subject_marks.values())
-
-            # Check 7-day rule: Cannot submit new grades within 7 days of previous submission
-            today = timezone.now().date()
-            previous_submission = StudentMarks.objects.filter(student_id=student_id).order_by(
-                '-submission_date').first()
-
-            if previous_submission:
-                days_since_last_submission = (today - previous_submission.submission_date).days
-                if days_since_last_submission < 7:
-                    failed_submissions.append({
-                        'id': student_id,
-                        'name': f"{student.first_name} {student.last_name}",
-                        'error': f'Cannot submit new grades within 7 days of the previous submission. Last submission: {previous_submission.submission_date.strftime("%Y-%m-%d")}'
-                    })
-                    continue
-
-            # All validation passed, create the marks record
-            try:
-                with transaction.atomic():
-                    new_marks = StudentMarks(
-                        student_id=student_id,
-                        math=subject_marks['Math'],
-                        eng=subject_marks['Eng'],
-                        kis=subject_marks['Kis'],
-                        sci=subject_marks['Sci'],
-                        sst=subject_marks['SST'],
-                        total_marks=total_marks,
-                        submission_date=today
-                    )
-                    new_marks.save()
-
-                    successful_submissions.append({
-                        'id': student_id,
-                        'name': f"{student.first_name} {student.last_name}"
-                    })
-            except Exception as e:
-                failed_submissions.append({
-                    'id': student_id,
-                    'error': str(e)
-                })
-
-        # Determine the response status based on submissions
-        if not successful_submissions and failed_submissions:
-            # If all submissions failed, return error status
-            return JsonResponse({
-                'detail': 'All submissions failed',
-                'errors': failed_submissions,
-                'submitted': []
-            }, status=400)
-        elif failed_submissions:
-            # If some submissions failed, return partial success
-            return JsonResponse({
-                'detail': 'Some submissions were successful',
-                'errors': failed_submissions,
-                'submitted': successful_submissions
-            }, status=207)  # 207 Multi-Status
-        else:
-            # If all submissions succeeded
-            return JsonResponse({
-                'detail': 'All grades submitted successfully',
-                'submitted': successful_submissions
-            }, status=200)
+        payload, status = summarize_submissions(successful_submissions, failed_submissions)
+        return JsonResponse(payload, status=status)
 
     except json.JSONDecodeError:
         return JsonResponse({'detail': 'Invalid JSON data'}, status=400)
@@ -133,12 +58,95 @@ def submit_grades(request):
         return JsonResponse({'detail': str(e)}, status=500)
 
 
+def get_submission_job(request, job_id):
+    """
+    API endpoint to poll a queued grade submission.
+    Once the job has completed, the response carries the same detail/errors/submitted
+    breakdown that a synchronous submit_grades call returns.
+    """
+    try:
+        job = GradeSubmissionJob.objects.get(id=job_id)
+    except GradeSubmissionJob.DoesNotExist:
+        return JsonResponse({'detail': f'Submission job with ID {job_id} does not exist'}, status=404)
+
+    response_data = {
+        'id': job.id,
+        'status': job.status,
+        'total_rows': job.total_rows,
+        'processed_rows': job.processed_rows,
+        'progress': round(job.processed_rows / job.total_rows * 100, 1) if job.total_rows else 100.0,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if job.status == 'completed':
+        response_data.update(job.result)
+    elif job.status == 'failed':
+        response_data['detail'] = job.error
+
+    return JsonResponse(response_data)
+
+
+INGEST_PARSERS = {
+    'application/x-ndjson': iter_ndjson_marks,
+    'application/jsonl': iter_ndjson_marks,
+    'text/csv': iter_csv_marks,
+}
+
+
+@csrf_exempt
+def ingest_grades(request):
+    """
+    API endpoint for whole-school mark uploads as NDJSON or CSV.
+    The body is parsed incrementally and committed in fixed-size chunks, and one
+    NDJSON result line is streamed back per chunk, followed by a summary line.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'detail': 'Only POST method is allowed'}, status=405)
+
+    parser = INGEST_PARSERS.get(request.content_type)
+    if parser is None:
+        return JsonResponse({
+            'detail': f'Unsupported content type. Expected one of: {", ".join(INGEST_PARSERS)}'
+        }, status=415)
+
+    chunk_size = getattr(settings, 'GRADES_INGEST_CHUNK_SIZE', 500)
+    # Read the request stream line by line instead of loading request.body
+    rows = parser(codecs.iterdecode(request, 'utf-8-sig'))
+    results = (json.dumps(result) + '\n' for result in ingest_marks(rows, chunk_size))
+    return StreamingHttpResponse(results, content_type='application/x-ndjson')
+
+
+def student_marks_scopes(request):
+    # Writes bump the scope of the integer primary key, so "05" and "5" must share it
+    try:
+        return [student_scope(int(request.GET.get('id')))]
+    except (TypeError, ValueError):
+        return []
+
+
+@versioned_condition(student_marks_scopes)
+@versioned_cache(student_marks_scopes)
 def get_student_marks(request):
+    """
+    API endpoint to get a student's marks history, newest first.
+    Supports the same fields= projection and format=columnar options as get_all_student_marks.
+    """
     student_id = request.GET.get('id')
 
     if not student_id:
         return JsonResponse({'detail': 'Student ID is required'}, status=400)
 
+    try:
+        student_id = int(student_id)
+    except ValueError:
+        return JsonResponse({'detail': 'Student ID must be a number'}, status=400)
+
+    try:
+        fields = parse_fields(request.GET.get('fields'), STUDENT_MARK_FIELDS)
+    except ValueError as e:
+        return JsonResponse({'detail': f'Invalid query parameters: {e}'}, status=400)
+
     try:
         # First check if student exists
         try:
@@ -147,24 +155,15 @@ def get_student_marks(request):
             return JsonResponse({'detail': f'Student with ID {student_id} does not exist'}, status=404)
 
         # Get all marks for this student, ordered by submission date (newest first)
-        marks = StudentMarks.objects.filter(student_id=student_id).order_by('-submission_date')
+        marks, row_values = project_marks(
+            StudentMarks.objects.filter(student_id=student_id), fields, STUDENT_MARK_FIELDS)
+        marks = marks.order_by('-submission_date')
 
         if not marks:
             return JsonResponse({'detail': 'No marks found for this student'}, status=404)
 
         # Format the response
-        marks_data = []
-        for mark in marks:
-            marks_data.append({
-                'id': mark.id,
-                'math': mark.math,
-                'eng': mark.eng,
-                'kis': mark.kis,
-                'sci': mark.sci,
-                'sst': mark.sst,
-                'total_marks': mark.total_marks,
-                'submission_date': mark.submission_date.strftime('%Y-%m-%d')
-            })
+        marks_data = format_marks(marks, fields, row_values, request.GET.get('format') == 'columnar')
 
         return JsonResponse({
             'student': {
@@ -179,6 +178,12 @@ def get_student_marks(request):
         return JsonResponse({'detail': str(e)}, status=500)
 
 
+def class_marks_scopes(request):
+    return [class_scope(request.GET.get('class_name'))]
+
+
+@versioned_condition(class_marks_scopes)
+@versioned_cache(class_marks_scopes)
 def get_class_marks(request):
     class_name = request.GET.get('class_name')
 
@@ -187,16 +192,21 @@ def get_class_marks(request):
 
     try:
         # Get all students in this class
-        students = Student.objects.filter(class_name=class_name)
+        students = list(Student.objects.filter(class_name=class_name))
 
         if not students:
             return JsonResponse({'detail': 'No students found in this class'}, status=404)
 
-        # Get the latest marks for each student
+        # Get the latest marks for every student in the class in one query
+        latest_by_student = {
+            mark.student_id: mark
+            for mark in latest_marks(StudentMarks.objects.filter(student__class_name=class_name))
+        }
+
         class_data = []
 
         for student in students:
-            latest_mark = StudentMarks.objects.filter(student_id=student.id).order_by('-submission_date').first()
+            latest_mark = latest_by_student.get(student.id)
 
             student_data = {
                 'id': student.id,
@@ -226,83 +236,114 @@ def get_class_marks(request):
         return JsonResponse({'detail': str(e)}, status=500)
 
 
-def get_all_student_marks(request):
+def class_statistics_scopes(request):
+    class_name = request.GET.get('class_name')
+    return [class_scope(class_name)] if class_name else [MARKS, STUDENTS]
+
+
+@versioned_condition(class_statistics_scopes)
+@versioned_cache(class_statistics_scopes)
+def get_class_statistics(request):
     """
-    API endpoint to get all student marks.
-    This view supports the frontend's data requirements for the StudentMarksPage component.
+    API endpoint for per-class subject statistics over each student's latest marks.
+    Returns mean/min/max/median and grade band counts (E.E/M.E/A.E/B.E) per subject and
+    for the average, for one class (?class_name=) or for every class.
     """
     try:
-        # Get all marks, ordered by submission date (newest first)
-        all_marks = StudentMarks.objects.all().order_by('-submission_date')
+        statistics = class_statistics(request.GET.get('class_name'))
+        return JsonResponse({'classes': statistics})
+    except Exception as e:
+        return JsonResponse({'detail': str(e)}, status=500)
 
-        # Format the response to match the frontend expectations
-        marks_data = []
-        for mark in all_marks:
-            # Check for None values and provide defaults
-            math_marks = mark.math if mark.math is not None else None
-            english_marks = mark.eng if mark.eng is not None else None
-            kiswahili_marks = mark.kis if mark.kis is not None else None
-            science_marks = mark.sci if mark.sci is not None else None
-            sst_marks = mark.sst if mark.sst is not None else None
-
-            marks_data.append({
-                'id': mark.id,
-                'student': mark.student_id,  # Foreign key to student
-                'math_marks': math_marks,  # Match frontend field naming
-                'english_marks': english_marks,  # Match frontend field naming
-                'kiswahili_marks': kiswahili_marks,  # Match frontend field naming
-                'science_marks': science_marks,  # Match frontend field naming
-                'sst_marks': sst_marks,  # Match frontend field naming
-                'total_marks': mark.total_marks,
-                'submission_date': mark.submission_date.strftime('%Y-%m-%d') if mark.submission_date else None
-            })
 
-        return JsonResponse(marks_data, safe=False)
+def rankings_scopes(request):
+    # School positions shift with any write anywhere, so rankings depend on all marks
+    return [MARKS, STUDENTS]
+
+
+@versioned_condition(rankings_scopes)
+@versioned_cache(rankings_scopes)
+def get_rankings(request):
+    """
+    API endpoint for stored class and school positions based on each student's latest marks.
+    Tied students share a position. With ?class_name= only that class is listed, in class order.
+    """
+    try:
+        rankings = [
+            {
+                'id': current.student.id,
+                'first_name': current.student.first_name,
+                'last_name': current.student.last_name,
+                'class_name': current.student.class_name,
+                'total_marks': current.math + current.eng + current.kis + current.sci + current.sst,
+                'class_position': current.class_position,
+                'school_position': current.school_position,
+                'submission_date': current.submission_date.strftime('%Y-%m-%d'),
+            }
+            for current in ranked_students(request.GET.get('class_name'))
+        ]
+        return JsonResponse({'rankings': rankings})
     except Exception as e:
         return JsonResponse({'detail': str(e)}, status=500)
 
+
+def all_marks_scopes(request):
+    return [MARKS, STUDENTS]
+
+
+@versioned_condition(all_marks_scopes)
+@versioned_cache(all_marks_scopes)
 def get_all_student_marks(request):
     """
     API endpoint to get all student marks.
     This view supports the frontend's data requirements for the StudentMarksPage component.
+
+    Optional filters: class_name, student, date_from and date_to (YYYY-MM-DD).
+    Passing page_size or cursor switches to keyset pagination, returning
+    {"results": [...], "next": <cursor or null>} instead of a bare list.
+    Passing stream=1 streams the full filtered list for bulk exports.
+    fields=a,b,... limits the output to those fields, and format=columnar returns
+    {"columns": [...], "data": [[...], ...]} with one array of values per column.
     """
     try:
-        # Get all marks, ordered by submission date (newest first)
-        all_marks = StudentMarks.objects.all().order_by('-submission_date')
+        try:
+            fields = parse_fields(request.GET.get('fields'), MARK_LIST_FIELDS)
+            columnar = request.GET.get('format') == 'columnar'
+
+            # Get all marks, ordered by submission date (newest first). Student details are
+            # annotated onto the marks query, so it costs one query however many rows it has.
+            all_marks, row_values = project_marks(
+                annotate_student_details(filter_marks(StudentMarks.objects.all(), request.GET)),
+                fields, MARK_LIST_FIELDS
+            )
+            all_marks = all_marks.order_by('-submission_date', '-id')
+
+            if request.GET.get('stream') in ('1', 'true'):
+                if columnar:
+                    raise ValueError('format=columnar cannot be streamed')
+                chunk_size = getattr(settings, 'MARKS_EXPORT_CHUNK_SIZE', 2000)
+                return StreamingHttpResponse(
+                    stream_marks_json(all_marks, fields, row_values, chunk_size),
+                    content_type='application/json'
+                )
+
+            paginated = 'page_size' in request.GET or 'cursor' in request.GET
+            if paginated:
+                page_size = int(request.GET.get('page_size') or getattr(settings, 'MARKS_PAGE_SIZE', 100))
+                if page_size < 1:
+                    raise ValueError('page_size must be a positive integer')
+                page_size = min(page_size, getattr(settings, 'MARKS_MAX_PAGE_SIZE', 1000))
+                all_marks, next_cursor = paginate_marks(all_marks, request.GET.get('cursor'), page_size)
+        except ValueError as e:
+            return JsonResponse({'detail': f'Invalid query parameters: {e}'}, status=400)
 
         # Format the response to match the frontend expectations
-        marks_data = []
-        for mark in all_marks:
-            # Check for None values and provide defaults
-            math_marks = mark.math if mark.math is not None else None
-            english_marks = mark.eng if mark.eng is not None else None
-            kiswahili_marks = mark.kis if mark.kis is not None else None
-            science_marks = mark.sci if mark.sci is not None else None
-            sst_marks = mark.sst if mark.sst is not None else None
-
-            # Look up student details
-            try:
-                student = Student.objects.get(id=mark.student_id)
-                student_exists = True
-                student_class = student.class_name
-            except Student.DoesNotExist:
-                student_exists = False
-                student_class = None
-
-            marks_data.append({
-                'id': mark.id,
-                'student': mark.student_id,  # Foreign key to student
-                'student_exists': student_exists,  # Flag to indicate if student exists
-                'class_name': student_class,  # Include class name directly with marks
-                'math_marks': math_marks,
-                'english_marks': english_marks,
-                'kiswahili_marks': kiswahili_marks,
-                'science_marks': science_marks,
-                'sst_marks': sst_marks,
-                'total_marks': mark.total_marks,
-                'submission_date': mark.submission_date.strftime('%Y-%m-%d') if mark.submission_date else None
-            })
+        marks_data = format_marks(all_marks, fields, row_values, columnar)
 
+        if paginated:
+            if columnar:
+                return JsonResponse({**marks_data, 'next': next_cursor, 'page_size': page_size})
+            return JsonResponse({'results': marks_data, 'next': next_cursor, 'page_size': page_size})
         return JsonResponse(marks_data, safe=False)
     except Exception as e:
         return JsonResponse({'detail': str(e)}, status=500)
@@ -350,8 +391,10 @@ def update_student_marks(request):
             # Calculate total marks
             mark.total_marks = sum(filter(None, [mark.math, mark.eng, mark.kis, mark.sci, mark.sst]))
 
-            # Save the updated mark
-            mark.save()
+            # Save the updated mark; the post_save signal keeps current marks and positions in
+            # sync inside the same transaction, so a failed refresh rolls the mark back too
+            with transaction.atomic():
+                mark.save()
 
             return JsonResponse({
                 'detail': 'Marks updated successfully',
@@ -5,10 +5,10 @@ from .models import Report
 
 @admin.register(Report)
 class ReportAdmin(admin.ModelAdmin):
-    list_display = ('id', 'report_type', 'class_name', 'student_id', 'generated_at', 'generated_by', 'download_count')
-    list_filter = ('report_type', 'generated_at')
+    list_display = ('id', 'report_type', 'class_name', 'student_id', 'generated_at', 'generated_by', 'download_count', 'status')
+    list_filter = ('report_type', 'status', 'generated_at')
     search_fields = ('class_name', 'student_id', 'generated_by__username')
-    readonly_fields = ('download_count',)
+    readonly_fields = ('download_count', 'last_downloaded_at')
 
     def has_change_permission(self, request, obj=None):
         # Reports should not be editable
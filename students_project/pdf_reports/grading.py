@@ -0,0 +1,57 @@
+# pdf_reports/grading.py
+"""
+Batch grading for report processing.
+
+A class's marks are graded in one pass: totals, averages and grade bands for every
+student and subject. NumPy is used when it is installed; otherwise a pure-Python
+path produces identical results.
+"""
+from bisect import bisect_right
+
+from grading_system.utils import GRADE_BANDS
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy is optional
+    np = None
+
+# Band lower bounds in ascending order, and the grade for each searchsorted/bisect index:
+# below the first bound is the catch-all band, at or above the last bound is the best band.
+BAND_BOUNDARIES = sorted(lowest_mark for lowest_mark, grade in GRADE_BANDS if lowest_mark is not None)
+BAND_GRADES = [grade for lowest_mark, grade in sorted(
+    GRADE_BANDS, key=lambda band: float('-inf') if band[0] is None else band[0])]
+
+
+def grade_marks(subject_marks, use_numpy=True):
+    """
+    Grade a batch of students.
+
+    subject_marks is a sequence of per-student rows of subject marks, all the same length.
+    Returns (totals, averages, subject_grades, average_grades): totals and averages per
+    student, a row of grades per student matching the subject columns, and the grade of
+    each average. Grades match calculate_grade for every mark.
+    """
+    if use_numpy and np is not None:
+        return _grade_marks_numpy(subject_marks)
+    return _grade_marks_python(subject_marks)
+
+
+def _grade_marks_numpy(subject_marks):
+    if not len(subject_marks):
+        return [], [], [], []
+    marks = np.asarray(subject_marks, dtype=np.int64)
+    totals = marks.sum(axis=1)
+    averages = totals / marks.shape[1]
+
+    grades = np.array(BAND_GRADES)
+    subject_grades = grades[np.searchsorted(BAND_BOUNDARIES, marks, side='right')]
+    average_grades = grades[np.searchsorted(BAND_BOUNDARIES, averages, side='right')]
+    return totals.tolist(), averages.tolist(), subject_grades.tolist(), average_grades.tolist()
+
+
+def _grade_marks_python(subject_marks):
+    totals = [sum(row) for row in subject_marks]
+    averages = [total / len(row) for total, row in zip(totals, subject_marks)]
+    subject_grades = [[BAND_GRADES[bisect_right(BAND_BOUNDARIES, mark)] for mark in row] for row in subject_marks]
+    average_grades = [BAND_GRADES[bisect_right(BAND_BOUNDARIES, average)] for average in averages]
+    return totals, averages, subject_grades, average_grades
@@ -0,0 +1,58 @@
+# pdf_reports/management/commands/benchmark_pdf_renderers.py
+import random
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from pdf_reports.renderers import RENDERERS
+from pdf_reports.utils import REPORT_TEMPLATE, build_student_results
+
+
+class Command(BaseCommand):
+    help = 'Time every PDF renderer on a synthetic all-students report (no database access)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=2000, help='Students in the synthetic school')
+        parser.add_argument('--classes', type=int, default=8, help='Classes the students are spread over')
+        parser.add_argument('--repeat', type=int, default=1, help='Runs per renderer; the best time is reported')
+        parser.add_argument('--renderer', action='append', choices=sorted(RENDERERS),
+                            help='Renderer to benchmark (repeatable, default: all)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the synthetic marks')
+
+    def build_context(self, student_count, class_count, seed):
+        rng = random.Random(seed)
+        students_by_class = {}
+        for student_id in range(1, student_count + 1):
+            class_name = f"Grade {student_id % class_count + 1}"
+            students_by_class.setdefault(class_name, []).append(SimpleNamespace(
+                id=student_id, first_name=f"Student{student_id}", last_name='Synthetic', class_name=class_name,
+            ))
+
+        class_groups = {}
+        for class_name, students in sorted(students_by_class.items()):
+            latest_marks = {
+                student.id: SimpleNamespace(**{subject: rng.randint(0, 100)
+                                               for subject in ('math', 'eng', 'kis', 'sci', 'sst')})
+                for student in students
+            }
+            totals = sorted((sum(vars(marks).values()), student_id) for student_id, marks in latest_marks.items())
+            positions = {student_id: position for position, (_, student_id) in enumerate(reversed(totals), start=1)}
+            class_groups[class_name] = build_student_results(students, latest_marks, positions)
+
+        return {'title': 'Student Results Report', 'class_groups': class_groups, 'today': timezone.now()}
+
+    def handle(self, *args, **options):
+        context = self.build_context(options['students'], options['classes'], options['seed'])
+        self.stdout.write(f"{options['students']} students in {len(context['class_groups'])} classes")
+
+        for name in options['renderer'] or sorted(RENDERERS):
+            renderer = RENDERERS[name]
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                pdf_file = renderer.render(REPORT_TEMPLATE, context)
+                timings.append(time.perf_counter() - started)
+            size = len(pdf_file.getvalue()) if pdf_file else 0
+            self.stdout.write(f"{name:<10} {min(timings):8.2f}s {size / 1024:10.1f} KiB")
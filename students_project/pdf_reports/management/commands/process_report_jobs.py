@@ -0,0 +1,31 @@
+# pdf_reports/management/commands/process_report_jobs.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from pdf_reports.utils import claim_next_report, generate_report_file
+
+
+class Command(BaseCommand):
+    help = 'Render reports requested in async mode by the download views'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the queue and exit instead of polling for new reports')
+        parser.add_argument('--sleep', type=float, default=5.0,
+                            help='Seconds to wait between polls when the queue is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            report = claim_next_report()
+            if report is None:
+                if options['once']:
+                    return
+                time.sleep(options['sleep'])
+                continue
+
+            report = generate_report_file(report)
+            message = f"Report #{report.id} {report.status}"
+            if report.error:
+                message += f": {report.error}"
+            self.stdout.write(message)
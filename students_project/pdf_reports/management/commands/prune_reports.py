@@ -0,0 +1,32 @@
+# pdf_reports/management/commands/prune_reports.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from pdf_reports.retention import prune_reports
+
+
+class Command(BaseCommand):
+    help = 'Delete old and least recently downloaded reports, with their files, per the retention settings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age-days', type=int,
+                            default=getattr(settings, 'REPORTS_MAX_AGE_DAYS', None),
+                            help='Remove reports not generated or downloaded for this many days')
+        parser.add_argument('--max-bytes', type=int,
+                            default=getattr(settings, 'REPORTS_MAX_TOTAL_BYTES', None),
+                            help='Evict least recently downloaded reports until saved PDFs fit in this size')
+        parser.add_argument('--keep-latest', type=int,
+                            default=getattr(settings, 'REPORTS_KEEP_LATEST', 1),
+                            help='Always keep this many of the newest reports per scope')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be removed without deleting anything')
+
+    def handle(self, *args, **options):
+        reports, files, freed_bytes = prune_reports(
+            max_age_days=options['max_age_days'],
+            max_total_bytes=options['max_bytes'],
+            keep_latest=options['keep_latest'],
+            dry_run=options['dry_run'],
+        )
+        prefix = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(f"{prefix} {reports} reports and {files} files ({freed_bytes / 1024:.1f} KiB)")
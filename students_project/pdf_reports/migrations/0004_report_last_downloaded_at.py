@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 08:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdf_reports', '0003_report_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='last_downloaded_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
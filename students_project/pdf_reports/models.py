@@ -1,5 +1,6 @@
 # pdf_reports/models.py
 from django.db import models
+from django.db.models import F
 from django.utils import timezone
 
 
@@ -10,6 +11,12 @@ class Report(models.Model):
         ('class', 'Class Report'),
         ('student', 'Student Report'),
     )
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    )
 
     report_type = models.CharField(max_length=10, choices=REPORT_TYPES)
     class_name = models.CharField(max_length=100, blank=True, null=True)
@@ -18,13 +25,31 @@ class Report(models.Model):
     generated_by = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True,
                                      related_name='generated_reports')
     download_count = models.IntegerField(default=0)
+    # Used by the retention policy to evict the least recently downloaded reports first
+    last_downloaded_at = models.DateTimeField(blank=True, null=True)
     file_path = models.CharField(max_length=255, blank=True, null=True)
+    # Hash of the report's scope and rendered data, used to serve unchanged reports without re-rendering
+    fingerprint = models.CharField(max_length=64, blank=True, null=True, db_index=True)
+    # Reports requested in async mode start pending and are rendered by process_report_jobs
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='ready', db_index=True)
+    error = models.TextField(blank=True, null=True)
+    started_at = models.DateTimeField(blank=True, null=True)
 
     class Meta:
         ordering = ['-generated_at']
         verbose_name = 'Report'
         verbose_name_plural = 'Reports'
 
+    def record_download(self):
+        """
+        Count a download with a single UPDATE that increments in the database, so concurrent
+        downloads never overwrite each other and no other column is rewritten.
+        """
+        self.last_downloaded_at = timezone.now()
+        Report.objects.filter(pk=self.pk).update(
+            download_count=F('download_count') + 1, last_downloaded_at=self.last_downloaded_at
+        )
+
     def __str__(self):
         if self.report_type == 'all':
             return f"All Students Report ({self.generated_at.strftime('%Y-%m-%d %H:%M')})"
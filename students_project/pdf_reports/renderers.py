@@ -0,0 +1,103 @@
+# pdf_reports/renderers.py
+"""
+PDF renderer backends for the results reports.
+
+Every backend takes the report template and the context built by
+utils.build_report_context and returns the PDF in a BytesIO, or None on error.
+PDF_RENDERERS maps report types to backend names; unlisted types use xhtml2pdf.
+"""
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.utils.dateformat import format as format_date
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import cm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from .utils import REPORT_SUBJECTS, render_sections_to_pdf
+
+DEFAULT_RENDERER = 'xhtml2pdf'
+
+# Column headings of the results table, as in student_results_pdf.html
+TABLE_HEADINGS = ['Position', 'Student Name', 'Math', 'English', 'Kiswahili', 'Science', 'SST',
+                  'Average (Grade)', 'Total Marks']
+# Fixed widths spare reportlab from measuring every cell; they fill a landscape A4 page
+COLUMN_WIDTHS = [w * cm for w in (2, 6.5, 2.4, 2.4, 2.4, 2.4, 2.4, 3.5, 2.5)]
+
+
+class XHTML2PDFRenderer:
+    """Lays out the HTML template with xhtml2pdf, one class section per worker process"""
+    name = 'xhtml2pdf'
+
+    def render(self, template_src, context):
+        return render_sections_to_pdf(template_src, context)
+
+
+class ReportLabTableRenderer:
+    """
+    Draws the results tables straight to PDF with reportlab, skipping HTML and CSS layout.
+
+    The output follows student_results_pdf.html (title, generation date, one table per class
+    and the closing line) but the template itself is not used.
+    """
+    name = 'reportlab'
+
+    def __init__(self):
+        styles = getSampleStyleSheet()
+        self.title_style = ParagraphStyle('ReportTitle', parent=styles['Title'], fontName='Helvetica-Bold')
+        self.text_style = ParagraphStyle('ReportText', parent=styles['Normal'], alignment=1)
+        self.class_style = ParagraphStyle('ClassTitle', parent=styles['Normal'], fontName='Helvetica-Bold',
+                                          fontSize=14, leading=18, alignment=1, backColor=colors.HexColor('#f0f0f0'),
+                                          spaceBefore=20, spaceAfter=8)
+        self.footer_style = ParagraphStyle('ReportFooter', parent=self.text_style, fontSize=9, spaceBefore=12)
+        self.table_style = TableStyle([
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#333333')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f2f2f2')]),
+        ])
+
+    def table_rows(self, students):
+        rows = [TABLE_HEADINGS]
+        for student in students:
+            rows.append(
+                [student['position'], student['student_name']]
+                + [f"{student[f'{subject}_marks']} {student[f'{subject}_grade']}" for subject in REPORT_SUBJECTS]
+                + [f"{student['average']} {student['avg_grade']}", student['total_marks']]
+            )
+        return rows
+
+    def render(self, template_src, context):
+        result = BytesIO()
+        document = SimpleDocTemplate(result, pagesize=landscape(A4), title=context['title'],
+                                     leftMargin=cm, rightMargin=cm, topMargin=cm, bottomMargin=cm)
+
+        story = [
+            Paragraph(escape(context['title']), self.title_style),
+            Paragraph(f"Generated on {format_date(context['today'], 'F j, Y')}", self.text_style),
+        ]
+        for class_name, students in context['class_groups'].items():
+            story.append(Paragraph(escape(f"Class: {class_name}"), self.class_style))
+            table = Table(self.table_rows(students), repeatRows=1, colWidths=COLUMN_WIDTHS)
+            table.setStyle(self.table_style)
+            story.append(table)
+        story.extend([Spacer(1, 12), Paragraph("End of Report", self.footer_style)])
+
+        document.build(story)
+        return result
+
+
+RENDERERS = {renderer.name: renderer for renderer in (XHTML2PDFRenderer(), ReportLabTableRenderer())}
+
+
+def get_renderer(report_type):
+    """Return the renderer configured for a report type in PDF_RENDERERS"""
+    name = getattr(settings, 'PDF_RENDERERS', {}).get(report_type, DEFAULT_RENDERER)
+    return RENDERERS[name]
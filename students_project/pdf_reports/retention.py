@@ -0,0 +1,134 @@
+# pdf_reports/retention.py
+"""
+Retention policy for saved PDF reports.
+
+Several Report rows can point at the same file (identical reports reuse the saved PDF),
+so eviction works on files: a file and every Report that references it are removed
+together, and a file is only deleted once no remaining Report points at it.
+
+PDFs under MEDIA_ROOT/reports that no Report references (left by older code, or by a
+request that failed between saving the file and creating its row) count toward the size
+budget too. Their modification time stands in for their last use, and they are only
+evicted once older than ORPHAN_GRACE_PERIOD so a report being saved is never removed.
+"""
+import os
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Report
+
+REPORTS_DIR = 'reports'
+ORPHAN_GRACE_PERIOD = timedelta(hours=1)
+
+
+def _last_used(report):
+    return report.last_downloaded_at or report.generated_at
+
+
+def _orphan_files(referenced):
+    """Map each PDF under MEDIA_ROOT/reports that no Report references to its modification time"""
+    reports_dir = os.path.join(settings.MEDIA_ROOT, REPORTS_DIR)
+    if not os.path.isdir(reports_dir):
+        return {}
+
+    orphans = {}
+    for entry in os.scandir(reports_dir):
+        file_path = os.path.join(REPORTS_DIR, entry.name)
+        if entry.is_file() and entry.name.endswith('.pdf') and file_path not in referenced:
+            orphans[file_path] = datetime.fromtimestamp(entry.stat().st_mtime, tz=timezone.get_current_timezone())
+    return orphans
+
+
+def plan_pruning(max_age_days=None, max_total_bytes=None, keep_latest=0, now=None):
+    """
+    Decide which reports and files the retention policy removes.
+
+    Returns (report_ids, file_paths, freed_bytes). Pending and running reports are never
+    touched, ready reports whose file has gone missing are always removed, and failed
+    reports are removed once they are older than max_age_days. Unreferenced PDFs count
+    toward max_total_bytes and are evicted like reports last used when they were written.
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=max_age_days) if max_age_days is not None else None
+
+    doomed_ids = []
+    files = defaultdict(list)
+    protected = set()
+    kept_per_scope = Counter()
+
+    reports = Report.objects.filter(status__in=['ready', 'failed']).order_by('-generated_at', '-id')
+    for report in reports:
+        if report.status == 'failed':
+            if cutoff is not None and report.generated_at < cutoff:
+                doomed_ids.append(report.id)
+            continue
+
+        if not report.file_path or not os.path.exists(os.path.join(settings.MEDIA_ROOT, report.file_path)):
+            doomed_ids.append(report.id)
+            continue
+
+        files[report.file_path].append(report)
+        # Reports are newest first, so the first keep_latest of each scope are protected
+        scope = (report.report_type, report.class_name, report.student_id)
+        if kept_per_scope[scope] < keep_latest:
+            kept_per_scope[scope] += 1
+            protected.add(report.file_path)
+
+    # Pending and running reports may reference files too, so check against every row
+    orphans = _orphan_files(set(Report.objects.exclude(file_path__isnull=True).values_list('file_path', flat=True)))
+
+    # Least recently used files first
+    candidates = sorted(
+        [(max(_last_used(report) for report in file_reports), file_path)
+         for file_path, file_reports in files.items() if file_path not in protected]
+        + [(modified, file_path) for file_path, modified in orphans.items()
+           if modified < now - ORPHAN_GRACE_PERIOD]
+    )
+    sizes = {file_path: os.path.getsize(os.path.join(settings.MEDIA_ROOT, file_path))
+             for file_path in [*files, *orphans]}
+    total_bytes = sum(sizes.values())
+
+    doomed_files = []
+    for last_used, file_path in candidates:
+        expired = cutoff is not None and last_used < cutoff
+        over_budget = max_total_bytes is not None and total_bytes > max_total_bytes
+        if not expired and not over_budget:
+            continue
+        doomed_files.append(file_path)
+        doomed_ids.extend(report.id for report in files.get(file_path, []))
+        total_bytes -= sizes[file_path]
+
+    return doomed_ids, doomed_files, sum(sizes[file_path] for file_path in doomed_files)
+
+
+def prune_reports(max_age_days=None, max_total_bytes=None, keep_latest=0, dry_run=False):
+    """
+    Apply the retention policy, deleting Report rows first and then their files.
+
+    Returns (reports removed, files removed, bytes freed). A file that another Report
+    started referencing since the plan was made is left on disk.
+    """
+    report_ids, file_paths, freed_bytes = plan_pruning(max_age_days, max_total_bytes, keep_latest)
+    if dry_run:
+        return len(report_ids), len(file_paths), freed_bytes
+
+    with transaction.atomic():
+        Report.objects.filter(id__in=report_ids).delete()
+        still_used = set(Report.objects.filter(file_path__in=file_paths).values_list('file_path', flat=True))
+
+    removed = 0
+    for file_path in file_paths:
+        if file_path in still_used:
+            freed_bytes -= os.path.getsize(os.path.join(settings.MEDIA_ROOT, file_path))
+            continue
+        try:
+            os.remove(os.path.join(settings.MEDIA_ROOT, file_path))
+            removed += 1
+        except FileNotFoundError:
+            pass
+
+    return len(report_ids), removed, freed_bytes
@@ -12,8 +12,10 @@ class ReportSerializer(serializers.ModelSerializer):
     class Meta:
         model = Report
         fields = ['id', 'report_type', 'class_name', 'student_id', 'generated_at',
-                  'generated_by', 'generated_by_name', 'download_count', 'file_path']
-        read_only_fields = ['generated_at', 'download_count', 'file_path']
+                  'generated_by', 'generated_by_name', 'download_count', 'last_downloaded_at', 'file_path',
+                  'status', 'error', 'started_at']
+        read_only_fields = ['generated_at', 'download_count', 'last_downloaded_at', 'file_path', 'status', 'error',
+                            'started_at']
 
 
 class StudentSerializer(serializers.ModelSerializer):
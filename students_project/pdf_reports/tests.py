@@ -1,3 +1,340 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from threading import Barrier, Thread
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from grading_system.models import StudentMarks
+from students_app.models import Student
+
+from .grading import grade_marks, np
+from . import views
+from .models import Report
+from .retention import prune_reports
+from .utils import claim_next_report, html_to_pdf
+from .utils import calculate_grade
+
+
+class GradeMarksTests(SimpleTestCase):
+    # Every mark on the band boundaries and around them, plus out-of-range values
+    MARKS = [[mark, 100 - mark, (mark * 7) % 101, 39, 70] for mark in range(-1, 102)]
+
+    def assert_matches_calculate_grade(self, use_numpy):
+        totals, averages, subject_grades, average_grades = grade_marks(self.MARKS, use_numpy=use_numpy)
+
+        for row, total, average, grades, average_grade in zip(
+                self.MARKS, totals, averages, subject_grades, average_grades):
+            self.assertEqual(total, sum(row))
+            self.assertEqual(average, sum(row) / len(row))
+            self.assertEqual(grades, [calculate_grade(mark) for mark in row])
+            self.assertEqual(average_grade, calculate_grade(sum(row) / len(row)))
+
+    def test_python_path_matches_calculate_grade(self):
+        self.assert_matches_calculate_grade(use_numpy=False)
+
+    @skipIf(np is None, 'NumPy is not installed')
+    def test_numpy_path_matches_calculate_grade(self):
+        self.assert_matches_calculate_grade(use_numpy=True)
+
+    @skipIf(np is None, 'NumPy is not installed')
+    def test_numpy_and_python_paths_agree(self):
+        self.assertEqual(grade_marks(self.MARKS, use_numpy=True), grade_marks(self.MARKS, use_numpy=False))
+
+    def test_fractional_averages_on_band_boundaries(self):
+        # Averages of 39.8, 40.0, 59.8, 60.0, 69.8 and 70.0
+        rows = [[40, 40, 40, 40, 39], [40] * 5, [60, 60, 60, 60, 59], [60] * 5, [70, 70, 70, 70, 69], [70] * 5]
+        for use_numpy in (False, True) if np is not None else (False,):
+            _, averages, _, average_grades = grade_marks(rows, use_numpy=use_numpy)
+            self.assertEqual(average_grades, [calculate_grade(average) for average in averages])
+            self.assertEqual(average_grades, ['B.E', 'A.E', 'A.E', 'M.E', 'M.E', 'E.E'])
+
+    def test_empty_batch(self):
+        self.assertEqual(grade_marks([], use_numpy=False), ([], [], [], []))
+        if np is not None:
+            self.assertEqual(grade_marks([], use_numpy=True), ([], [], [], []))
+
+
+class RecordDownloadTests(TestCase):
+    def test_stale_instances_do_not_lose_increments(self):
+        report = Report.objects.create(report_type='all', file_path='reports/all.pdf')
+        # Two requests loaded the report before either counted its download
+        first = Report.objects.get(pk=report.pk)
+        second = Report.objects.get(pk=report.pk)
+
+        first.record_download()
+        second.record_download()
+
+        report.refresh_from_db()
+        self.assertEqual(report.download_count, 2)
+        self.assertIsNotNone(report.last_downloaded_at)
+
+    def test_only_counter_columns_are_written(self):
+        report = Report.objects.create(report_type='all', file_path='reports/all.pdf')
+        stale = Report.objects.get(pk=report.pk)
+        Report.objects.filter(pk=report.pk).update(file_path='reports/moved.pdf')
+
+        stale.record_download()
+
+        report.refresh_from_db()
+        self.assertEqual(report.file_path, 'reports/moved.pdf')
+
+
+class ConcurrentRecordDownloadTests(TransactionTestCase):
+    THREADS = 8
+    DOWNLOADS_PER_THREAD = 25
+
+    def test_concurrent_downloads_are_all_counted(self):
+        report = Report.objects.create(report_type='all', file_path='reports/all.pdf')
+        barrier = Barrier(self.THREADS)
+        errors = []
+
+        def download():
+            try:
+                stale = Report.objects.get(pk=report.pk)
+                barrier.wait()
+                for _ in range(self.DOWNLOADS_PER_THREAD):
+                    stale.record_download()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [Thread(target=download) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        report.refresh_from_db()
+        self.assertEqual(report.download_count, self.THREADS * self.DOWNLOADS_PER_THREAD)
+
+
+class PruneReportsTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        os.makedirs(os.path.join(self.media_root, 'reports'))
+        self.now = timezone.now()
+
+    def write_file(self, name, size=100, days_old=0):
+        file_path = os.path.join('reports', name)
+        full_path = os.path.join(self.media_root, file_path)
+        with open(full_path, 'wb') as f:
+            f.write(b'x' * size)
+        modified = (self.now - timedelta(days=days_old)).timestamp()
+        os.utime(full_path, (modified, modified))
+        return file_path
+
+    def create_report(self, file_path, days_old=0, class_name='Grade 1'):
+        return Report.objects.create(report_type='class', class_name=class_name, file_path=file_path,
+                                     generated_at=self.now - timedelta(days=days_old))
+
+    def exists(self, file_path):
+        return os.path.exists(os.path.join(self.media_root, file_path))
+
+    def test_keep_latest_protects_newest_report_of_each_scope(self):
+        newest = self.create_report(self.write_file('new.pdf'), days_old=40)
+        older = self.create_report(self.write_file('old.pdf'), days_old=50)
+        other_class = self.create_report(self.write_file('other.pdf'), days_old=60, class_name='Grade 2')
+
+        self.assertEqual(prune_reports(max_age_days=30, max_total_bytes=0, keep_latest=1), (1, 1, 100))
+
+        self.assertEqual(set(Report.objects.values_list('id', flat=True)), {newest.id, other_class.id})
+        self.assertFalse(self.exists(older.file_path))
+        self.assertTrue(self.exists(newest.file_path) and self.exists(other_class.file_path))
+
+    def test_shared_file_is_kept_while_any_report_uses_it(self):
+        file_path = self.write_file('shared.pdf')
+        expired = self.create_report(file_path, days_old=60)
+        recent = self.create_report(file_path, days_old=60)
+        recent.record_download()
+
+        # The recent download keeps the file, and with it every report pointing at it
+        self.assertEqual(prune_reports(max_age_days=30), (0, 0, 0))
+        self.assertEqual(Report.objects.count(), 2)
+
+        # A report that starts using the file after planning keeps it on disk
+        with mock.patch('pdf_reports.retention.plan_pruning', return_value=([expired.id], [file_path], 100)):
+            self.assertEqual(prune_reports(max_age_days=30), (1, 0, 0))
+        self.assertTrue(self.exists(file_path))
+        self.assertTrue(Report.objects.filter(id=recent.id).exists())
+
+    def test_unreferenced_files_count_toward_the_budget(self):
+        old_orphan = self.write_file('old_orphan.pdf', days_old=60)
+        new_orphan = self.write_file('new_orphan.pdf')
+        report = self.create_report(self.write_file('report.pdf', days_old=5), days_old=5)
+
+        self.assertEqual(prune_reports(max_age_days=30), (0, 1, 100))
+        self.assertFalse(self.exists(old_orphan))
+
+        # Fresh orphans may belong to a report being saved; the budget evicts the report instead
+        self.assertEqual(prune_reports(max_total_bytes=150), (1, 1, 100))
+        self.assertTrue(self.exists(new_orphan))
+        self.assertFalse(Report.objects.filter(id=report.id).exists())
+
+    def test_dry_run_deletes_nothing(self):
+        report = self.create_report(self.write_file('old.pdf'), days_old=60)
+
+        out = StringIO()
+        call_command('prune_reports', '--dry-run', '--max-age-days', '30', '--keep-latest', '0', stdout=out)
+
+        self.assertIn('Would remove 1 reports and 1 files', out.getvalue())
+        self.assertTrue(Report.objects.filter(id=report.id).exists())
+        self.assertTrue(self.exists(report.file_path))
+
+
+@override_settings(PDF_RENDER_WORKERS=1)
+class ReportFingerprintCacheTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        student = Student.objects.create(first_name='Amina', last_name='Otieno', student_id='S1', class_name='Grade 1')
+        self.marks = StudentMarks.objects.create(student=student, math=80, eng=70, kis=60, sci=50, sst=40,
+                                                 total_marks=300)
+
+    def download(self):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        response = views.download_class_results(request, 'Grade 1')
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+    def saved_files(self):
+        return os.listdir(os.path.join(self.media_root, 'reports'))
+
+    def test_unchanged_data_reuses_the_saved_report(self):
+        self.download()
+        self.download()
+
+        report = Report.objects.get()
+        self.assertEqual(report.download_count, 2)
+        self.assertEqual(self.saved_files(), [os.path.basename(report.file_path)])
+
+    def test_changed_marks_render_a_new_report(self):
+        self.download()
+        self.marks.math = 90
+        self.marks.total_marks = 310
+        self.marks.save()
+        self.download()
+
+        self.assertEqual(Report.objects.count(), 2)
+        self.assertEqual(len(set(Report.objects.values_list('fingerprint', flat=True))), 2)
+        self.assertEqual(len(self.saved_files()), 2)
+
+    def test_switching_renderer_renders_a_new_report(self):
+        self.download()
+        with self.settings(PDF_RENDERERS={'class': 'reportlab'}):
+            self.download()
+            self.download()
+
+        self.assertEqual(Report.objects.count(), 2)
+        self.assertEqual(len(self.saved_files()), 2)
+
+
+@override_settings(PDF_RENDER_WORKERS=1)
+class ClassReportCardsTests(TestCase):
+    def setUp(self):
+        for name, total in [('Brian', 70), ('Amina', 90), ('Chege', 80)]:
+            student = Student.objects.create(first_name=name, last_name='Test', student_id=name, class_name='Grade 1')
+            StudentMarks.objects.create(student=student, math=total, eng=0, kis=0, sci=0, sst=0, total_marks=total)
+
+    def download(self):
+        response = views.download_class_report_cards(RequestFactory().get('/'), 'Grade 1')
+        self.assertEqual(response.status_code, 200)
+        return zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+
+    def test_one_card_per_student_in_position_order(self):
+        archive = self.download()
+
+        self.assertEqual(archive.namelist(), ['001_amina-test.pdf', '002_chege-test.pdf', '003_brian-test.pdf'])
+        for name in archive.namelist():
+            self.assertTrue(archive.read(name).startswith(b'%PDF'))
+
+    def test_failed_cards_are_listed_in_the_archive(self):
+        render = html_to_pdf
+        with mock.patch('pdf_reports.utils.html_to_pdf',
+                        side_effect=lambda html: None if 'Chege' in html else render(html)):
+            archive = self.download()
+
+        self.assertEqual(archive.namelist(), ['001_amina-test.pdf', '002_chege-test.error.txt', '003_brian-test.pdf'])
+        self.assertIn(b'Chege Test could not be generated', archive.read('002_chege-test.error.txt'))
+
+
+class DownloadSavedReportTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        os.makedirs(os.path.join(self.media_root, 'reports'))
+        with open(os.path.join(self.media_root, 'reports', 'report.pdf'), 'wb') as f:
+            f.write(bytes(range(100)))
+        self.report = Report.objects.create(report_type='all', file_path='reports/report.pdf')
+
+    def download(self, range_header=None):
+        headers = {'HTTP_RANGE': range_header} if range_header else {}
+        response = views.download_saved_report(RequestFactory().get('/', **headers), self.report.id)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, content
+
+    def test_ranges(self):
+        cases = [
+            (None, 200, bytes(range(100))),
+            ('bytes=0-9', 206, bytes(range(10))),
+            ('bytes=90-', 206, bytes(range(90, 100))),
+            ('bytes=-5', 206, bytes(range(95, 100))),
+            ('bytes=50-500', 206, bytes(range(50, 100))),
+            # Inverted, malformed and multi-range headers are ignored
+            ('bytes=5-3', 200, bytes(range(100))),
+            ('items=0-9', 200, bytes(range(100))),
+            ('bytes=0-1,5-6', 200, bytes(range(100))),
+            ('bytes=100-', 416, b''),
+        ]
+        for range_header, status_code, content in cases:
+            with self.subTest(range_header=range_header):
+                response, body = self.download(range_header)
+                self.assertEqual(response.status_code, status_code)
+                self.assertEqual(body, content)
+
+    def test_downloads_starting_at_the_first_byte_are_counted(self):
+        self.download()
+        self.download('bytes=0-')
+        self.download('bytes=50-')
+
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.download_count, 2)
+
+
+class ClaimNextReportTests(TestCase):
+    def test_reports_abandoned_by_a_dead_worker_are_claimed_again(self):
+        stale = Report.objects.create(report_type='all', status='running',
+                                      started_at=timezone.now() - timedelta(hours=1))
+        busy = Report.objects.create(report_type='all', status='running', started_at=timezone.now())
+
+        with self.settings(REPORT_JOB_TIMEOUT=900):
+            claimed = claim_next_report()
+
+        self.assertEqual(claimed.id, stale.id)
+        self.assertEqual(claimed.status, 'running')
+        stale.refresh_from_db()
+        self.assertGreater(stale.started_at, timezone.now() - timedelta(minutes=1))
+        busy.refresh_from_db()
+        self.assertEqual(busy.status, 'running')
+        self.assertIsNone(claim_next_report())
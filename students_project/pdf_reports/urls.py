@@ -8,10 +8,13 @@ urlpatterns = [
     # Web URLs
     path('results/all/', views.download_all_results, name='download_all_results'),
     path('results/class/<str:class_name>/', views.download_class_results, name='download_class_results'),
+    path('results/class/<str:class_name>/cards/', views.download_class_report_cards,
+         name='download_class_report_cards'),
     path('results/student/<int:student_id>/', views.download_student_results, name='download_student_results'),
     path('report/<int:report_id>/', views.download_saved_report, name='download_saved_report'),
 
     # API URLs
     path('api/reports/', views.api_get_reports, name='api_get_reports'),
     path('api/report/<int:report_id>/', views.api_download_report, name='api_download_report'),
+    path('api/report/<int:report_id>/status/', views.api_report_status, name='api_report_status'),
 ]
\ No newline at end of file
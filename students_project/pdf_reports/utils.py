@@ -1,36 +1,83 @@
 # pdf_reports/utils.py
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
+import hashlib
+import json
 import os
-from datetime import datetime
+import re
+import zipfile
+from datetime import datetime, timedelta
+from itertools import groupby
+from operator import attrgetter
 from django.template.loader import get_template
 from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from pypdf import PdfWriter
 from xhtml2pdf import pisa
 from django.core.files.storage import FileSystemStorage
-from django.db.models import Sum, Avg
+from django.db.models import Avg, Q, Sum
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.text import slugify
+
+from grading_system.models import StudentMarks
+from grading_system.utils import GRADE_BANDS, class_positions
+from students_app.models import Student
+from .models import Report
+from .grading import grade_marks
+
+REPORT_TEMPLATE = 'student_results_pdf.html'
+
+# A single byte range; multi-range requests are answered with the whole file
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+RANGE_CHUNK_SIZE = 64 * 1024
+
+# Report column prefixes, in the order of the math, eng, kis, sci, sst mark fields
+REPORT_SUBJECTS = ['math', 'english', 'kiswahili', 'science', 'sst']
 
 
 def calculate_grade(marks):
     """Calculate grade based on marks"""
-    if marks >= 70:
-        return 'E.E'
-    elif marks >= 60:
-        return 'M.E'
-    elif marks >= 40:
-        return 'A.E'
-    else:
-        return 'B.E'
+    for lowest_mark, grade in GRADE_BANDS:
+        if lowest_mark is None or marks >= lowest_mark:
+            return grade
 
 
 def process_student_marks(students, marks_queryset):
-    """Process marks for all students with position ranking based on total marks."""
+    """
+    Process marks for all students with their class position.
+
+    Positions are the tie-aware class ranks stored by grading_system.utils.refresh_rankings;
+    students without marks have no position and are listed last.
+    """
+    students = list(students)
+    student_ids = [student.id for student in students]
+    positions = class_positions(student_ids)
+
+    # Fetch every student's marks in one query, oldest first, so the latest submission wins
+    latest_marks = {}
+    for marks in marks_queryset.filter(student_id__in=student_ids).order_by('submission_date', 'id'):
+        latest_marks[marks.student_id] = marks
+
+    return build_student_results(students, latest_marks, positions)
+
+
+def build_student_results(students, latest_marks, positions):
+    """
+    Grade students and order them by class position.
+
+    latest_marks and positions are keyed by student ID; students missing from
+    latest_marks are reported with zero marks and listed last.
+    """
     student_results = []
 
     # First, gather all student data
+    graded_students = []
     for student in students:
-        # Use student_id instead of student to match the model field
-        marks = marks_queryset.filter(student_id=student.id).first()  # Assuming one result per student
+        marks = latest_marks.get(student.id)
         if not marks:
-            student_result = {
+            student_results.append({
                 'student_name': f"{student.first_name} {student.last_name}",
                 'math_marks': 0, 'math_grade': '(E)',
                 'english_marks': 0, 'english_grade': '(E)',
@@ -39,43 +86,31 @@ def process_student_marks(students, marks_queryset):
                 'sst_marks': 0, 'sst_grade': '(E)',
                 'average': 0.0, 'avg_grade': '(E)',
                 'total_marks': 0,
-            }
+                'position': '-',
+            })
         else:
             # Map internal fields to printable subject names
-            english = marks.eng
-            kiswahili = marks.kis
-            math = marks.math
-            science = marks.sci
-            sst = marks.sst
-
-            total = math + english + kiswahili + science + sst
-            average = total / 5
-
-            student_result = {
-                'student_name': getattr(student, 'full_name', f"{student.first_name} {student.last_name}"),
-                'math_marks': math,
-                'math_grade': f"{calculate_grade(math)}",
-                'english_marks': english,
-                'english_grade': f"{calculate_grade(english)}",
-                'kiswahili_marks': kiswahili,
-                'kiswahili_grade': f"{calculate_grade(kiswahili)}",
-                'science_marks': science,
-                'science_grade': f"{calculate_grade(science)}",
-                'sst_marks': sst,
-                'sst_grade': f"{calculate_grade(sst)}",
-                'average': round(average, 2),
-                'avg_grade': f"{calculate_grade(average)}",
-                'total_marks': total
-            }
+            graded_students.append((student, [marks.math, marks.eng, marks.kis, marks.sci, marks.sst]))
 
-        student_results.append(student_result)
+    # Grade the whole batch at once
+    totals, averages, subject_grades, average_grades = grade_marks([marks for _, marks in graded_students])
 
-    # Sort the results by total marks in descending order
-    student_results.sort(key=lambda x: x['total_marks'], reverse=True)
+    for (student, marks), total, average, grades, avg_grade in zip(
+            graded_students, totals, averages, subject_grades, average_grades):
+        student_result = {
+            'student_name': getattr(student, 'full_name', f"{student.first_name} {student.last_name}"),
+            'average': round(average, 2),
+            'avg_grade': avg_grade,
+            'total_marks': total,
+            'position': positions.get(student.id, '-'),
+        }
+        for subject, subject_marks, grade in zip(REPORT_SUBJECTS, marks, grades):
+            student_result[f'{subject}_marks'] = subject_marks
+            student_result[f'{subject}_grade'] = grade
+        student_results.append(student_result)
 
-    # Assign positions after sorting
-    for i, result in enumerate(student_results):
-        result['position'] = i + 1  # Positions start from 1
+    # Order by position, with unranked students last
+    student_results.sort(key=lambda x: x['position'] if x['position'] != '-' else float('inf'))
 
     return student_results
 
@@ -94,6 +129,30 @@ def get_class_results(students_by_class, marks_model):
     return class_groups
 
 
+def get_all_class_results(class_name=None):
+    """
+    Get results for every class, or only class_name, from a single query.
+
+    Students are joined to their current (latest) marks and positions, ordered by class,
+    and grouped as the rows stream in, so the data phase is one round trip however many
+    classes and students there are.
+    """
+    students = Student.objects.select_related('current_marks').order_by('class_name', 'first_name', 'last_name')
+    if class_name is not None:
+        students = students.filter(class_name=class_name)
+    class_groups = {}
+
+    for class_name, class_students in groupby(students.iterator(chunk_size=2000), key=attrgetter('class_name')):
+        class_students = list(class_students)
+        latest_marks = {
+            student.id: student.current_marks for student in class_students if hasattr(student, 'current_marks')
+        }
+        positions = {student_id: current.class_position for student_id, current in latest_marks.items()}
+        class_groups[class_name] = build_student_results(class_students, latest_marks, positions)
+
+    return class_groups
+
+
 def render_to_pdf(template_src, context_dict):
     """Render HTML template to PDF"""
     template = get_template(template_src)
@@ -105,6 +164,136 @@ def render_to_pdf(template_src, context_dict):
     return None
 
 
+def html_to_pdf(html):
+    """
+    Convert rendered HTML to PDF bytes, or None on error.
+    Kept at module level and free of Django state so it can run in a worker process.
+    """
+    result = BytesIO()
+    pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result)
+    if not pdf.err:
+        return result.getvalue()
+    return None
+
+
+def render_sections_to_pdf(template_src, context_dict):
+    """
+    Render a multi-class report one class section per worker process and merge the pages.
+
+    Each section is rendered to HTML here, with the header kept on the first section and
+    the footer on the last, and only the xhtml2pdf conversion runs in the pool. Every class
+    therefore starts on a new page. Falls back to a single render_to_pdf call when there is
+    one class or PDF_RENDER_WORKERS is 1.
+    """
+    class_groups = context_dict['class_groups']
+    workers = getattr(settings, 'PDF_RENDER_WORKERS', None) or os.cpu_count() or 1
+    if len(class_groups) < 2 or workers < 2:
+        return render_to_pdf(template_src, context_dict)
+
+    template = get_template(template_src)
+    last = len(class_groups) - 1
+    sections = [
+        template.render({
+            **context_dict,
+            'class_groups': {class_name: students},
+            'hide_header': index > 0,
+            'hide_footer': index < last,
+        })
+        for index, (class_name, students) in enumerate(class_groups.items())
+    ]
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(sections))) as executor:
+        pdfs = list(executor.map(html_to_pdf, sections))
+    if any(pdf is None for pdf in pdfs):
+        return None
+
+    writer = PdfWriter()
+    for pdf in pdfs:
+        writer.append(BytesIO(pdf))
+    result = BytesIO()
+    writer.write(result)
+    return result
+
+
+def _card_file(stem, student_name, pdf):
+    """ZIP member for one report card: the PDF, or a note saying it could not be rendered"""
+    if pdf is None:
+        return f"{stem}.error.txt", f"The report card for {student_name} could not be generated.\n".encode('utf-8')
+    return f"{stem}.pdf", pdf
+
+
+def render_report_cards(template_src, class_name, student_results, today):
+    """
+    Render one PDF per student of a class, yielding (filename, content) in position order.
+
+    The cards are rendered to HTML here and converted by a pool of PDF_RENDER_WORKERS
+    processes; results are yielded as soon as each card (and those before it) is done.
+    A card that fails to convert is yielded as a text file saying so, so that a missing
+    student shows up in the archive instead of silently vanishing from it.
+    """
+    template = get_template(template_src)
+    cards = []
+    for index, student_result in enumerate(student_results, start=1):
+        name = student_result['student_name']
+        html = template.render({
+            'title': f"Report Card for {name}",
+            'class_groups': {class_name: [student_result]},
+            'today': today,
+        })
+        cards.append((f"{index:03d}_{slugify(name) or 'student'}", name, html))
+
+    workers = getattr(settings, 'PDF_RENDER_WORKERS', None) or os.cpu_count() or 1
+    if workers < 2 or len(cards) < 2:
+        for stem, name, html in cards:
+            yield _card_file(stem, name, html_to_pdf(html))
+        return
+
+    executor = ProcessPoolExecutor(max_workers=min(workers, len(cards)))
+    try:
+        pdfs = executor.map(html_to_pdf, [html for _, _, html in cards])
+        for (stem, name, _), pdf in zip(cards, pdfs):
+            yield _card_file(stem, name, pdf)
+    finally:
+        # Stop rendering the remaining cards if the client goes away mid-download
+        executor.shutdown(cancel_futures=True)
+
+
+class ZipStream:
+    """Write-only file object that hands zipfile output back in chunks instead of keeping it"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(files):
+    """
+    Stream a ZIP archive of (filename, content) pairs.
+
+    Each member is compressed and yielded as soon as it is added, so only one file is held
+    in memory at a time. Files whose content is None are left out.
+    """
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for filename, content in files:
+            if content is None:
+                continue
+            archive.writestr(filename, content)
+            yield stream.pop()
+    yield stream.pop()
+
+
 def save_pdf(pdf_file, filename):
     """Save PDF file to disk"""
     # Create directory for reports if it doesn't exist
@@ -117,4 +306,208 @@ def save_pdf(pdf_file, filename):
     filename = f"{filename}_{timestamp}.pdf"
     filename = fs.save(filename, pdf_file)
 
-    return os.path.join('reports', filename)
\ No newline at end of file
+    return os.path.join('reports', filename)
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(RANGE_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_report_file(request, file_path, filename):
+    """
+    Stream a saved report from disk without loading it into memory.
+
+    Whole-file requests go through FileResponse, which lets the server use sendfile.
+    A single Range header is answered with 206 Partial Content so interrupted downloads
+    can resume, and a range that starts past the end of the file gets 416. Malformed,
+    inverted and multi-range headers are ignored and the whole file is sent.
+    """
+    size = os.path.getsize(file_path)
+    match = RANGE_RE.match(request.META.get('HTTP_RANGE', '').strip())
+
+    first, last = match.groups() if match else ('', '')
+    if first and last and int(first) > int(last):
+        # An inverted range is syntactically invalid, so like a malformed one it is ignored
+        first = last = ''
+
+    if not first and not last:
+        response = FileResponse(open(file_path, 'rb'), as_attachment=True, filename=filename)
+    else:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(size - int(last), 0)
+            end = size - 1 if int(last) else -1
+
+        if start >= size or start > end:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        length = end - start + 1
+        response = StreamingHttpResponse(_read_range(file_path, start, length), status=206,
+                                         content_type='application/pdf')
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def counts_as_download(response):
+    """
+    Whether a report response starts a download: the whole file, or a range from byte 0
+    as download managers request first. Resumed ranges are not counted again.
+    """
+    return response.status_code == 200 or response.get('Content-Range', '').startswith('bytes 0-')
+
+
+def report_fingerprint(template_src, context, report_type, class_name=None, student_id=None, renderer=None):
+    """
+    Hash everything that ends up in a rendered report: its scope, the renderer backend,
+    the template source, the title, the result rows and the generation date printed in the header.
+    """
+    template = get_template(template_src)
+    payload = json.dumps({
+        'scope': [report_type, class_name, student_id],
+        'renderer': renderer,
+        'template': getattr(template.template, 'source', template_src),
+        'title': context['title'],
+        'class_groups': context['class_groups'],
+        'date': context['today'].date().isoformat(),
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def find_cached_report(fingerprint, report_type, class_name=None, student_id=None):
+    """Return the newest saved Report with this fingerprint whose file is still on disk, or None"""
+    reports = Report.objects.filter(
+        fingerprint=fingerprint, report_type=report_type, class_name=class_name, student_id=student_id
+    ).exclude(file_path__isnull=True)
+    for report in reports:
+        if os.path.exists(os.path.join(settings.MEDIA_ROOT, report.file_path)):
+            return report
+    return None
+
+
+def build_report_context(report_type='all', class_name=None, student_id=None):
+    """
+    Gather the template context and base filename for a report.
+
+    Returns (context, filename), with context None when there are no students to report on.
+    Raises Http404 for an unknown student.
+    """
+    title = "Student Results Report"
+
+    # Get students based on report type
+    if report_type == 'student' and student_id:
+        student = get_object_or_404(Student, id=student_id)
+        students = [student]
+        title = f"Results Report for {student.first_name} {student.last_name}"
+        filename = f"student_{student_id}_report"
+        # For single student reports, create a dictionary with one class entry
+        students_by_class = {student.class_name: students}
+    elif report_type == 'class' and class_name:
+        students = Student.objects.filter(class_name=class_name).order_by('first_name', 'last_name')
+        title = f"Results Report for Class {class_name}"
+        filename = f"class_{class_name}_report"
+        # For class reports, create a dictionary with one class entry
+        students_by_class = {class_name: students}
+    else:
+        # For all students, fetch every class with its latest marks in one query
+        students_by_class = None
+        filename = "all_students_report"
+
+    if students_by_class is None:
+        class_groups = get_all_class_results()
+    else:
+        # Skip empty classes
+        students_by_class = {cls: students for cls, students in students_by_class.items() if students}
+
+        # Process results with ranking by class
+        class_groups = get_class_results(students_by_class, StudentMarks)
+
+    # Only process if we have students
+    if not class_groups:
+        return None, filename
+
+    # Prepare context for the template
+    context = {
+        'title': title,
+        'class_groups': class_groups,
+        'today': timezone.now(),
+    }
+    return context, filename
+
+
+def requeue_stale_reports(timeout=None):
+    """
+    Put reports left running for longer than timeout seconds (REPORT_JOB_TIMEOUT) back to pending.
+    Rendering has no side effects until the report is marked ready, so a report whose
+    worker died is simply rendered again. Returns the number of reports requeued.
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'REPORT_JOB_TIMEOUT', 900)
+    stale = Q(started_at__lt=timezone.now() - timedelta(seconds=timeout)) | Q(started_at__isnull=True)
+    return Report.objects.filter(stale, status='running').update(status='pending', started_at=None)
+
+
+def claim_next_report():
+    """
+    Claim the oldest pending Report by flipping it to running, after requeueing stale ones.
+    Returns the claimed report, or None when nothing is pending.
+    """
+    requeue_stale_reports()
+    while True:
+        report = Report.objects.filter(status='pending').order_by('generated_at', 'id').first()
+        if report is None:
+            return None
+        started_at = timezone.now()
+        if Report.objects.filter(id=report.id, status='pending').update(status='running', started_at=started_at):
+            report.status = 'running'
+            report.started_at = started_at
+            return report
+
+
+def generate_report_file(report):
+    """
+    Render the PDF for a claimed async Report and mark it ready, or failed with the error.
+    An identical report that is already saved is reused instead of being rendered again.
+    """
+    from .renderers import get_renderer
+
+    try:
+        context, filename = build_report_context(report.report_type, report.class_name, report.student_id)
+        if context is None:
+            raise ValueError('No students found with marks')
+
+        renderer = get_renderer(report.report_type)
+        fingerprint = report_fingerprint(REPORT_TEMPLATE, context, report.report_type,
+                                         report.class_name, report.student_id, renderer.name)
+        cached_report = find_cached_report(fingerprint, report.report_type, report.class_name, report.student_id)
+        if cached_report:
+            report.file_path = cached_report.file_path
+        else:
+            pdf_file = renderer.render(REPORT_TEMPLATE, context)
+            if not pdf_file:
+                raise ValueError('Error generating PDF')
+            report.file_path = save_pdf(pdf_file, filename)
+        report.fingerprint = fingerprint
+        report.status = 'ready'
+        report.generated_at = timezone.now()
+    except Exception as e:
+        report.status = 'failed'
+        report.error = str(e)
+
+    report.save(update_fields=['file_path', 'fingerprint', 'status', 'error', 'generated_at'])
+    return report
@@ -1,98 +1,99 @@
 # pdf_reports/views.py
 from django.shortcuts import render, get_object_or_404
-from django.http import HttpResponse, FileResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.http import content_disposition_header
 from django.views.decorators.http import require_GET
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework import status
 
-from io import BytesIO
 import os
 from django.conf import settings
 
 from students_app.models import Student
-from grading_system.models import StudentMarks
+
 # Import the Report model from models.py instead of defining it here
 from .models import Report
-from .utils import get_class_results, render_to_pdf, save_pdf
+from .utils import (
+    REPORT_TEMPLATE, build_report_context, counts_as_download, find_cached_report, get_all_class_results,
+    render_report_cards, report_fingerprint, save_pdf, serve_report_file, stream_zip,
+)
+from .renderers import get_renderer
 
 
 def generate_results_report(request, report_type='all', class_name=None, student_id=None):
     """Generate and save PDF report based on report type"""
-    title = "Student Results Report"
+    if request.GET.get('async') in ('1', 'true'):
+        return queue_results_report(request, report_type, class_name, student_id)
 
-    # Get students based on report type
-    if report_type == 'student' and student_id:
-        student = get_object_or_404(Student, id=student_id)
-        students = [student]
-        title = f"Results Report for {student.first_name} {student.last_name}"
-        filename = f"student_{student_id}_report"
-        # For single student reports, create a dictionary with one class entry
-        students_by_class = {student.class_name: students}
-    elif report_type == 'class' and class_name:
-        students = Student.objects.filter(class_name=class_name).order_by('first_name', 'last_name')
-        title = f"Results Report for Class {class_name}"
-        filename = f"class_{class_name}_report"
-        # For class reports, create a dictionary with one class entry
-        students_by_class = {class_name: students}
-    else:
-        # For all students, group by class
-        students_by_class = {}
-        all_students = Student.objects.all().order_by('class_name', 'first_name', 'last_name')
-
-        for student in all_students:
-            if student.class_name not in students_by_class:
-                students_by_class[student.class_name] = []
-            students_by_class[student.class_name].append(student)
-
-        filename = "all_students_report"
-
-    # Skip empty classes
-    students_by_class = {cls: students for cls, students in students_by_class.items() if students}
+    context, filename = build_report_context(report_type, class_name, student_id)
 
     # Only process if we have students
-    if not students_by_class:
+    if context is None:
         return HttpResponse('No students found with marks', status=404)
 
-    # Process results with ranking by class
-    class_groups = get_class_results(students_by_class, StudentMarks)
+    # Serve the saved copy if a report with identical content was already rendered
+    renderer = get_renderer(report_type)
+    fingerprint = report_fingerprint(REPORT_TEMPLATE, context, report_type, class_name, student_id, renderer.name)
+    report = find_cached_report(fingerprint, report_type, class_name, student_id)
+    if report:
+        file_path = os.path.join(settings.MEDIA_ROOT, report.file_path)
+        response = serve_report_file(request, file_path, f"{filename}.pdf")
 
-    # Prepare context for the template
-    context = {
-        'title': title,
-        'class_groups': class_groups,
-        'today': timezone.now(),
-    }
+        # Update download count
+        if counts_as_download(response):
+            report.record_download()
+        return response
 
     # Generate PDF
-    pdf_file = render_to_pdf('student_results_pdf.html', context)
+    pdf_file = renderer.render(REPORT_TEMPLATE, context)
 
     if pdf_file:
-        # Save PDF to disk
-        file_path = save_pdf(BytesIO(pdf_file.getvalue()), filename)
+        # Save PDF to disk, then serve it from there instead of from the in-memory copy
+        file_path = save_pdf(pdf_file, filename)
+        pdf_file.close()
 
-        # Create report record
-        report = Report.objects.create(
+        # Create report record, counting this response as its first download
+        Report.objects.create(
             report_type=report_type,
             class_name=class_name,
             student_id=student_id,
             generated_by=request.user if request.user.is_authenticated else None,
-            file_path=file_path
+            file_path=file_path,
+            fingerprint=fingerprint,
+            download_count=1,
+            last_downloaded_at=timezone.now()
         )
 
-        # Return PDF as response
-        response = HttpResponse(pdf_file.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{filename}.pdf"'
+        return serve_report_file(request, os.path.join(settings.MEDIA_ROOT, file_path), f"{filename}.pdf")
 
-        # Update download count
-        report.download_count += 1
-        report.save()
+    return HttpResponse('Error generating PDF', status=400)
 
-        return response
 
-    return HttpResponse('Error generating PDF', status=400)
+def queue_results_report(request, report_type='all', class_name=None, student_id=None):
+    """
+    Create a pending report for the process_report_jobs worker to render.
+    The client polls the status URL and downloads the report once it is ready.
+    """
+    if report_type == 'student' and student_id:
+        get_object_or_404(Student, id=student_id)
+
+    report = Report.objects.create(
+        report_type=report_type,
+        class_name=class_name,
+        student_id=student_id,
+        generated_by=request.user if request.user.is_authenticated else None,
+        status='pending'
+    )
+
+    return JsonResponse({
+        'report_id': report.id,
+        'status': report.status,
+        'status_url': reverse('pdf_reports:api_report_status', args=[report.id]),
+    }, status=202)
 
 
 @require_GET
@@ -107,6 +108,19 @@ def download_class_results(request, class_name):
     return generate_results_report(request, report_type='class', class_name=class_name)
 
 
+@require_GET
+def download_class_report_cards(request, class_name):
+    """Download a ZIP with one report card PDF per student in a class"""
+    class_groups = get_all_class_results(class_name)
+    if not class_groups:
+        return HttpResponse('No students found in this class', status=404)
+
+    cards = render_report_cards(REPORT_TEMPLATE, class_name, class_groups[class_name], timezone.now())
+    response = StreamingHttpResponse(stream_zip(cards), content_type='application/zip')
+    response['Content-Disposition'] = content_disposition_header(True, f"class_{class_name}_report_cards.zip")
+    return response
+
+
 @require_GET
 def download_student_results(request, student_id):
     """Download results for a specific student"""
@@ -118,17 +132,21 @@ def download_saved_report(request, report_id):
     """Download a previously generated report"""
     report = get_object_or_404(Report, id=report_id)
 
+    if report.status != 'ready':
+        return HttpResponse(f'Report is {report.status}', status=409)
+
     # Check if file exists
     file_path = os.path.join(settings.MEDIA_ROOT, report.file_path)
     if not os.path.exists(file_path):
         return HttpResponse('Report file not found', status=404)
 
-    # Update download count
-    report.download_count += 1
-    report.save()
+    response = serve_report_file(request, file_path, os.path.basename(file_path))
 
-    # Return file response
-    return FileResponse(open(file_path, 'rb'), as_attachment=True, filename=os.path.basename(file_path))
+    # Update download count, once per download rather than once per resumed range
+    if counts_as_download(response):
+        report.record_download()
+
+    return response
 
 
 # API views
@@ -148,14 +166,31 @@ def api_download_report(request, report_id):
     """API endpoint to download a report"""
     report = get_object_or_404(Report, id=report_id)
 
+    if report.status != 'ready':
+        return Response({'error': f'Report is {report.status}', 'status': report.status},
+                        status=status.HTTP_409_CONFLICT)
+
     # Check if file exists
     file_path = os.path.join(settings.MEDIA_ROOT, report.file_path)
     if not os.path.exists(file_path):
         return Response({'error': 'Report file not found'}, status=status.HTTP_404_NOT_FOUND)
 
-    # Update download count
-    report.download_count += 1
-    report.save()
+    response = serve_report_file(request, file_path, os.path.basename(file_path))
+
+    # Update download count, once per download rather than once per resumed range
+    if counts_as_download(response):
+        report.record_download()
+
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def api_report_status(request, report_id):
+    """API endpoint to poll the status of a report requested in async mode"""
+    report = get_object_or_404(Report, id=report_id)
 
-    # Return file response
-    return FileResponse(open(file_path, 'rb'), as_attachment=True, filename=os.path.basename(file_path))
\ No newline at end of file
+    data = {'report_id': report.id, 'status': report.status, 'error': report.error}
+    if report.status == 'ready':
+        data['download_url'] = reverse('pdf_reports:api_download_report', args=[report.id])
+    return Response(data)
@@ -5,7 +5,15 @@ from students_app.models import Student
 from .serializers import StudentSerializer
 from .models import ClassDetails
 from .serializers import ClassDetailsSerializer
+from grading_system.cache import STUDENTS, versioned_cache, versioned_condition
 
+
+def student_list_scopes(request):
+    return [STUDENTS]
+
+
+@versioned_condition(student_list_scopes)
+@versioned_cache(student_list_scopes)
 @api_view(['GET', 'POST'])
 def student_list(request):
     """
@@ -149,6 +149,57 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 LOGIN_URL = '/admin/login/'
 
+# Response cache for the marks and student read endpoints (see grading_system.cache).
+# Any Django cache backend can be plugged in here. The file-based default is shared by
+# all worker processes on one host; LocMemCache is only safe with a single process.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+    }
+}
+MARKS_CACHE_ALIAS = 'default'
+MARKS_CACHE_TIMEOUT = 3600
+
+# Number of rows validated and committed per chunk by the streaming marks ingest endpoint
+GRADES_INGEST_CHUNK_SIZE = 500
+
+# Seconds a grade submission job may stay running before process_grade_jobs treats its
+# worker as dead and marks it failed
+GRADE_JOB_TIMEOUT = 3600
+
+# Default and maximum page sizes for the keyset-paginated marks listing
+MARKS_PAGE_SIZE = 100
+MARKS_MAX_PAGE_SIZE = 1000
+
+# Rows fetched per database round trip when streaming the full marks export (?stream=1)
+MARKS_EXPORT_CHUNK_SIZE = 2000
+
+# Worker processes used to render the classes of a multi-class PDF report in parallel.
+# None uses every CPU; 1 renders the whole report in a single xhtml2pdf pass.
+PDF_RENDER_WORKERS = None
+
+# Seconds an async report may stay running before process_report_jobs assumes its worker
+# died and queues it again
+REPORT_JOB_TIMEOUT = 900
+
+# PDF renderer per report type ('all', 'class', 'student'): 'xhtml2pdf' lays out the HTML
+# template, 'reportlab' draws the results tables directly and is much faster on large reports
+PDF_RENDERERS = {
+    'all': 'xhtml2pdf',
+    'class': 'xhtml2pdf',
+    'student': 'xhtml2pdf',
+}
+
+# Retention policy applied by the prune_reports command (see pdf_reports.retention).
+# Reports unused for REPORTS_MAX_AGE_DAYS are removed, then the least recently downloaded
+# ones until saved PDFs fit in REPORTS_MAX_TOTAL_BYTES. The newest REPORTS_KEEP_LATEST
+# reports of each scope (all students, a class or a student) are always kept.
+# None disables the age or size limit.
+REPORTS_MAX_AGE_DAYS = 30
+REPORTS_MAX_TOTAL_BYTES = 500 * 1024 * 1024
+REPORTS_KEEP_LATEST = 1
+
 # your_project/settings.py
 
 # Supabase Configuration